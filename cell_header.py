@@ -18,30 +18,37 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-from typing import Any, DefaultDict, List, Set, Text
+import os
+from typing import Any, Counter, DefaultDict, List, NamedTuple, Set, Text
 
 import attr
 import numpy as np
 
-ABSOLUTE_DIR = "/home/gaffney/psdata"
+# Data files are kept under this directory.  Set CELL_LINK_DATA_DIR in the
+# environment, before importing, to keep them somewhere else.
+ABSOLUTE_DIR = os.environ.get("CELL_LINK_DATA_DIR", "/home/gaffney/psdata")
 
 CELL_FILES_DIR = ABSOLUTE_DIR + "/cell_files"
 COLUMN_FILES_DIR = ABSOLUTE_DIR + "/column_data"
 DATE_SET_DIR = ABSOLUTE_DIR + "/dateset_data"
 DATES_FILE = "dates_file"
 DATES_SET_FILE = "dates_set_file"
+DATES_JOURNAL_FILE = "dates_journal"
+COLUMN_DEPENDENCIES_FILE = "column_dependencies"
 BACKUP = "backup"
 
 # TODO: More robust date availability checking
 CHECK_DATE_AVAILABILITY = False
 SNAPSHOT_KEY = "SNAPSHOT"
 MAX_DATE = 99999999
+# The most pushed dates that a DateSet journal holds before it gets compacted.
+JOURNAL_COMPACT_SIZE = 10000
 
 # Throughout the library, Dates are expected to be integers of format YYYYMMDD.
 Date = int
 CellKey = Text
 ColumnName = Text
-Snapshot = DefaultDict[CellKey, int]
+Snapshot = Counter[CellKey]
 
 
 class NoneClass(object):
@@ -51,15 +58,22 @@ class NoneClass(object):
 
 def nonish(x):
     """Encapsulates the many ways that a cell can be missing a value."""
-    if isinstance(x, NoneClass):
+    # Check the most common types of cell values first, so that we don't fall
+    # through to the (slow) try block for these.
+    if x is None:
         return True
+    if isinstance(x, float):
+        return x != x
+    if isinstance(x, (int, str)):
+        return False
 
-    if x is None:
+    if isinstance(x, NoneClass):
         return True
     try:
         if np.isnan(x):
             return True
-    except:
+    except (TypeError, ValueError):
+        # Not a numeric type, or not a single value.
         pass
     if x != x:
         return True
@@ -82,19 +96,20 @@ def default_or(x: Any, default_value=0) -> Any:
     return x
 
 
-@attr.s(frozen=True)
-class CellAddr(object):
+class CellAddr(NamedTuple):
     """Used to reference the row (date) and column of a cell.
 
-    This class is immutable.
+    This class is immutable.  It's a NamedTuple, because a great many of these
+    get made and hashed as we read and write cells, and tuples are cheapest to
+    build and hash.
 
     Attributes:
         date: The date of this data point.
         col: The name of the column of this data point.
     """
 
-    date: Date = attr.ib()
-    col: ColumnName = attr.ib()
+    date: Date
+    col: ColumnName
 
 
 # TODO: Add a repr
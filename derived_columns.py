@@ -27,50 +27,99 @@ Waterfall is a column that keeps a running sum of some other row.
 Examples of these are in README.rst.
 """
 
-from copy import deepcopy
+from collections import Counter
 from typing import Callable
 
 from table import *
 
 SimpleFunc = Callable[[Dict], Any]
+VectorizedFunc = Callable[[Dict[ColumnName, np.ndarray]], np.ndarray]
 
 
-def _calculate_f(table: Table, f: SimpleFunc,
-                 required_columns: List[ColumnName],
-                 cell_addr: CellAddr, key: Text) -> Any:
+def _calculate_f(f: SimpleFunc, column_slices: Dict[ColumnName, Dict],
+                 key: Text) -> Any:
     """Calculate f, using values from the table, for a given key.
 
     This is a helper function for the simple formula column.
 
-    First looks up (in the passed table) the values for the given date (from
-    cell_addr) / key along each of the required_columns.  It stores thes into
-    a dict, which then gets passed to f, and returns the result.
-
-    The call to table should assert that the date of the cells that we're
-    updating (read from cell_addr) is at most the date that the dependent
-    cells are available on.
+    First looks up (in the passed column slices) the values for the given key
+    along each of the required columns.  It stores these into a dict, which
+    then gets passed to f, and returns the result.  If any of the values is
+    missing, then f isn't called, and None is returned.
 
     Arguments:
-        table: The cell-link table that we use to look-up values.
         f: The function that we will run on a dict of values to get a scalar
             value as result.
-        required_columns: The columns that f depends on.
+        column_slices: A dict keyed by the columns that f depends on, whose
+            values are the {key: value} slices of those columns on a single
+            date, as returned by table.get_column_slice.
         key: The key that we want to find in each of the columns in our lookup
             to pass to f.
     """
     dispatcher = dict()
-    for col in required_columns:
-        dispatcher[col] = table.get_cell_value(
-            CellAddr(cell_addr.date, col), key,
-            assert_available_on=cell_addr.date)
-
-    for _, v in dispatcher.items():
+    for col, column_slice in column_slices.items():
+        v = column_slice[key]
+        # Stop at the first missing value, without reading the rest.
         if nonish(v):
             return None
+        dispatcher[col] = v
 
     return f(dispatcher)
 
 
+def _calculate_vectorized_f(vectorized_f: VectorizedFunc,
+                            column_slices: Dict[ColumnName, Dict],
+                            keys: List[Text]) -> List[Any]:
+    """Calculate vectorized_f, using values from the table, for a list of keys.
+
+    This is a helper function for the simple formula column.
+
+    Builds an array for each of the required columns, holding the values for
+    each of the passed keys in order.  Rows that are missing a value in any
+    column are dropped, and the remaining rows are passed to vectorized_f in a
+    single call.
+
+    Arguments:
+        vectorized_f: The function that we will run on a dict of arrays to get
+            an array of results, one for each row.
+        column_slices: A dict keyed by the columns that vectorized_f depends
+            on, whose values are the {key: value} slices of those columns on a
+            single date, as returned by table.get_column_slice.
+        keys: The keys that we want to calculate values for.
+
+    Returns:
+        A list of the results, one for each key, in the same order as keys.
+        Keys that are missing a value in a required column get None.
+    """
+    present = np.ones(len(keys), dtype=bool)
+    raw_columns = dict()
+    for col, column_slice in column_slices.items():
+        values = np.empty(len(keys), dtype=object)
+        for i, key in enumerate(keys):
+            v = column_slice[key]
+            # Same test for a missing value as _calculate_f.
+            if nonish(v):
+                present[i] = False
+            values[i] = v
+        raw_columns[col] = values
+
+    result = np.full(len(keys), None, dtype=object)
+    if present.any():
+        # Let numpy pick a (hopefully numeric) dtype for the present values.
+        # numpy makes strings of every value if any one is a string, so keep
+        # a mixed column as objects, the values that f would see.
+        columns = dict()
+        for col, values in raw_columns.items():
+            values = values[present]
+            column = np.array(values.tolist())
+            if column.dtype.kind in "SU" and not all(
+                    isinstance(v, (str, bytes)) for v in values):
+                column = values
+            columns[col] = column
+        result[present] = np.asarray(vectorized_f(columns)).tolist()
+    return result.tolist()
+
+
 class SimpleFormula(Column):
     """A column in which each cell can be computed via a simple formula on
     the other columns, same row.
@@ -84,14 +133,24 @@ class SimpleFormula(Column):
             name.
         required_columns: A set of names for the columns upon which this column
             depends.
+        vectorized_f: Optional.  A version of f that acts on arrays, rather
+            than single values.  It takes a dict, keyed by column name, of
+            arrays holding the values of many rows, and returns an array of
+            results, one per row.  If set, this is used in place of f on
+            refresh, and is called once per date rather than once per row.
     """
 
+    # Default for columns that were saved before vectorized_f existed.
+    vectorized_f: Optional[VectorizedFunc] = None
+
     def __init__(self, name: Text, table: Table, f: SimpleFunc,
-                 required_columns: List[Text]):
+                 required_columns: List[Text],
+                 vectorized_f: Optional[VectorizedFunc] = None):
         self.f = f
+        self.vectorized_f = vectorized_f
         self.required_columns = required_columns
         for col in self.required_columns:
-            table.cm.get_column(col)._column_dependencies.add(name)
+            table.cm.add_dependency(col, name)
 
         # Should set the name and the table.
         super().__init__(name, table)
@@ -101,10 +160,10 @@ class SimpleFormula(Column):
 
         We may assume that all dependent columns are up-to-date.
 
-        This function loops through all the cell addresses that need
-        refreshing, and calculates a new value for each key in those
-        addresses.  Then it marks the dependent cell addresses, being those
-        addresses of the same date in a dependent column.
+        This function loops through all the dates that need refreshing, and
+        calculates a new value for each key on those dates.  Setting a value
+        that changed marks the same date as needing a refresh in each dependent
+        column; unchanged values don't trigger any downstream work.
 
         Arguments:
             table: The table that this column lives in, will use to update
@@ -113,16 +172,30 @@ class SimpleFormula(Column):
         if self.readonly:
             return
 
-        for cell_addr in self.table.need_refresh[self.name]:
-            for key in self.table.all_keys_for_address(cell_addr):
-                new_value = _calculate_f(self.table, self.f,
-                                         self.required_columns, cell_addr, key)
-                self.table.set_cell_value(cell_addr, key, new_value)
-
-            # Schedule updates.  The refresh order guarantees that these haven't
-            # hit yet
-            for dep in self.cell_dependencies(cell_addr):
-                self.table.need_refresh[dep.col].add(dep)
+        # Go in date order, so that each month's pages are visited together.
+        for date in sorted(self.table.need_refresh[self.name]):
+            cell_addr = CellAddr(date, self.name)
+            keys = list(self.table.all_keys_for_date(date))
+
+            # Pull each of the required columns for the whole date at once.
+            # The call to table should assert that the date of the cells
+            # that we're updating is at most the date that the dependent cells
+            # are available on.
+            column_slices = {
+                col: self.table.get_column_slice(date, col,
+                                                 assert_available_on=date)
+                for col in self.required_columns}
+
+            if self.vectorized_f is not None:
+                new_values = _calculate_vectorized_f(self.vectorized_f,
+                                                     column_slices, keys)
+                self.table.set_cell_values(cell_addr,
+                                           dict(zip(keys, new_values)))
+            else:
+                self.table.set_cell_values(
+                    cell_addr,
+                    {key: _calculate_f(self.f, column_slices, key)
+                     for key in keys})
 
 
 @attr.s(frozen=True)
@@ -275,7 +348,9 @@ class Waterfall(Column):
             metric.  This is a time difference, given as an int; so that 10000
             means 1 year.  Should only be set to a multiple of years.
         snapshot_master: Responsible for saving and loading snapshots.  We save
-            a snapshot at the beginning of each quarter.
+            a snapshot at the beginning of each quarter.  Loaded on first use.
+        snapshot_dates: The dates on which snapshots have been saved.  Loaded
+            on first use.
     """
 
     def __init__(self, name: ColumnName, table: Table,
@@ -284,7 +359,7 @@ class Waterfall(Column):
                  output_key: ColumnName, tail_length_years: int = 1):
         self.required_columns = required_columns
         for col in self.required_columns:
-            table.cm.get_column(col)._column_dependencies.add(name)
+            table.cm.add_dependency(col, name)
 
         self.input_maps = input_maps
         self.output_key = output_key
@@ -293,24 +368,25 @@ class Waterfall(Column):
         # Should set the name and the table.
         super().__init__(name, table)
 
-    def _date_to_snapshot_date(self, date: Date) -> Date:
+    @staticmethod
+    def _date_to_snapshot_date(date: Date) -> Date:
         """Maps dates to the start of a snapshot.
 
         We save snapshots at the start of each quarter, so this maps to the
         start of a quarter.
 
+        This is only integer arithmetic, so it may also be passed a numpy array
+        of dates, which will be mapped element-wise.
+
         Arguments:
             date: The date that we want to map.
 
         Returns:
             The resulting date from the map.
         """
-        year_month = date // 100
-        year, month = year_month // 100, year_month % 100
-        quarter = (month - 1) // 3  # 0 indexed
-        st_date = year * 10000 + (quarter * 3 + 1) * 100 + 1
-
-        return st_date
+        # Keep the year, round the month down to the start of its quarter, and
+        # set the day to 1.
+        return date // 10000 * 10000 + (date // 100 % 100 - 1) // 3 * 300 + 101
 
     def _get_snapshot_increment(self, date: Date) -> Snapshot:
         """From the passed table, get all the data from the date in Snapshot
@@ -341,24 +417,32 @@ class Waterfall(Column):
         Returns:
             Snapshot representing this single date in the table.
         """
-        result = defaultdict(int)
-        # Get all rows for date
-        for key in self.table.all_keys_for_address(CellAddr(date, self.name)):
-            # All the input maps
-            for in_map in self.input_maps:
-                key_in_result = self.table.get_cell_value(
-                    CellAddr(date, in_map.key_column), key)
-                if key_in_result is None:
+        result = Counter()
+        for in_map in self.input_maps:
+            map_keys = self.table.get_column_slice(
+                date, in_map.key_column, check_date_availability=False)
+            value_addr = CellAddr(date, in_map.value_column)
+            for key, map_key in map_keys.items():
+                # Skip rows without a key, and don't read their values.
+                if map_key is None:
                     continue
-                result[key_in_result] += default_or(
-                    self.table.get_cell_value(
-                        CellAddr(date, in_map.value_column), key))
+                # Read missing values as zero.  Store Python numbers, never
+                # numpy scalars, in the Snapshot.
+                value = default_or(self.table.get_cell_value(value_addr, key))
+                if isinstance(value, np.generic):
+                    value = value.item()
+                result[map_key] += value
         return result
 
     def _save_snapshot(self, date: Date, snapshot: Snapshot):
-        """A pass-through that saves the snapshot and records the date."""
+        """A pass-through that saves a copy of the snapshot and records the
+        date.
+
+        The values in a Snapshot are numbers, which are immutable, so a shallow
+        copy is enough to keep later changes to snapshot out of the saved one.
+        """
         self.snapshot_dates.push_date(date, SNAPSHOT_KEY)
-        self.snapshot_master.set_date_value(date, deepcopy(snapshot))
+        self.snapshot_master.set_date_value(date, Counter(snapshot))
 
     def refresh(self) -> None:
         """Recalculates the rows for this column.
@@ -385,98 +469,158 @@ class Waterfall(Column):
             return
 
         # Look for the most recent snapshot, and start working with that.
-        min_date = min(ca.date for ca in self.table.need_refresh[self.name])
+        min_date = min(self.table.need_refresh[self.name])
         first_snapshot_ind = self.snapshot_dates.smallest_ind_gt_date(
             min_date) - 1
         if first_snapshot_ind == -1:
             # No previously-saved snapshot found.
             first_snapshot_date = self._date_to_snapshot_date(min_date)
-            working_snapshot: Snapshot = defaultdict(int)
+            working_snapshot: Snapshot = Counter()
         else:
             first_snapshot_date = self.snapshot_dates.dates[first_snapshot_ind]
-            working_snapshot = self.snapshot_master.get_date_value(
-                first_snapshot_date)  # type: Snapshot
-            if working_snapshot is None:
+            saved_snapshot = self.snapshot_master.get_date_value(
+                first_snapshot_date)
+            if saved_snapshot is None:
                 # This should never happen.
                 raise LookupError(
                     "Couldn't load snapshot that is expected to exist.")
-
-        # Defines the window for which the snapshot represents the sum.  Defined
-        # by spanning dates in [window_st, window_en).
+            # Copy, so that we don't modify the saved snapshot as we go.
+            working_snapshot = Counter(saved_snapshot)
+
+        # All the dates we will read, in order.  The first of these are the
+        # window for which the snapshot represents the sum, spanning dates in
+        # [window_st, first_snapshot_date).  These are already summed into
+        # working_snapshot.  The rest are the dates for which we need to update
+        # this cell; these get added as we go.
         window_st = first_snapshot_date - self.tail_length
-        window_en = first_snapshot_date
-        window_dates = self.table.ds.slice(window_st, window_en - 1)
-
-        # These are the dates for which we need to update this cell.
-        cell_dates_to_update = self.table.ds.slice(st_date=first_snapshot_date)
-
-        # Make a sorted list of the snapshots we will encounter along the way.
-        # These will have to be updated as we pass them.
-        snapshot_dates_to_update = sorted(
-            list(set(map(self._date_to_snapshot_date, cell_dates_to_update))))
-
-        def _expire_less_than(d):
-            """Deletes all the entries in window_dates that have a date less
-            than d."""
-            nonlocal window_dates
-            while window_dates and window_dates[0] < d:
-                for k, v in self._get_snapshot_increment(
-                        window_dates[0]).items():
-                    working_snapshot[k] -= v
-                window_dates = window_dates[1:]
-
-        while cell_dates_to_update:
+        dates = self.table.ds.slice_array(st_date=window_st)
+        num_window_dates = int(np.searchsorted(dates, first_snapshot_date))
+        cell_dates = dates[num_window_dates:]
+
+        # The sorted snapshots we will encounter along the way.  These will
+        # have to be updated as we pass them, which is just before the first
+        # cell date that is at least the snapshot date.  The cell dates are
+        # sorted, and mapping to snapshot dates rounds down, so these come out
+        # sorted already; we only need to drop repeats of the previous date.
+        snapshot_dates = self._date_to_snapshot_date(cell_dates)
+        snapshot_dates = snapshot_dates[
+            np.diff(snapshot_dates, prepend=-1) != 0]
+        snapshot_cell_inds = np.searchsorted(cell_dates, snapshot_dates)
+
+        # For each cell date and snapshot date, the index in dates of the first
+        # date that is still within tail_length.  Everything before that index
+        # must be removed from working_snapshot first.
+        cell_expire_inds = np.searchsorted(dates,
+                                           cell_dates - self.tail_length)
+        snapshot_expire_inds = np.searchsorted(
+            dates, snapshot_dates - self.tail_length)
+
+        # Increments that have been added to working_snapshot, but not yet
+        # expired, by index in dates.  Saves re-reading the table at expiry.
+        increment_cache: List[Optional[Snapshot]] = [None] * len(dates)
+
+        # Index in dates of the oldest date summed in working_snapshot.
+        expired_ind = 0
+
+        def _expire_before(ind):
+            """Removes all the dates before index ind from working_snapshot."""
+            nonlocal expired_ind
+            while expired_ind < ind:
+                increment = increment_cache[expired_ind]
+                if increment is None:
+                    increment = self._get_snapshot_increment(
+                        int(dates[expired_ind]))
+                increment_cache[expired_ind] = None
+                if increment:
+                    working_snapshot.subtract(increment)
+                expired_ind += 1
+
+        snapshot_ind = 0
+        for i, next_cell_date in enumerate(cell_dates.tolist()):
             # Check if any snapshots need to be saved off.
-            while snapshot_dates_to_update and snapshot_dates_to_update[0] <= \
-                    cell_dates_to_update[0]:
-                next_snapshot_date = snapshot_dates_to_update[0]
-                snapshot_dates_to_update = snapshot_dates_to_update[1:]
-                _expire_less_than(next_snapshot_date - self.tail_length)
-                self._save_snapshot(next_snapshot_date, working_snapshot)
-
-            # Update next cell
-            next_cell_date = cell_dates_to_update[0]
-            cell_dates_to_update = cell_dates_to_update[1:]
-            window_dates.append(next_cell_date)
+            while snapshot_ind < len(snapshot_dates) and \
+                    snapshot_cell_inds[snapshot_ind] <= i:
+                _expire_before(snapshot_expire_inds[snapshot_ind])
+                self._save_snapshot(int(snapshot_dates[snapshot_ind]),
+                                    working_snapshot)
+                snapshot_ind += 1
 
             # Reduce for dates falling out of range.
-            _expire_less_than(next_cell_date - self.tail_length)
+            _expire_before(cell_expire_inds[i])
 
             # Update this column.
             next_cell_addr = CellAddr(next_cell_date, self.name)
-            for k in self.table.all_keys_for_address(next_cell_addr):
-                key_in_snapshot = self.table.get_cell_value(
-                    CellAddr(next_cell_date, self.output_key), k)
-                self.table.set_cell_value(
-                    next_cell_addr, k, working_snapshot[key_in_snapshot])
+            output_keys = self.table.get_column_slice(
+                next_cell_date, self.output_key, check_date_availability=False)
+            self.table.set_cell_values(
+                next_cell_addr,
+                {k: working_snapshot[output_key]
+                 for k, output_key in output_keys.items()})
 
             # Increase working_snapshot for the new date.
-            for k, v in self._get_snapshot_increment(next_cell_date).items():
-                working_snapshot[k] += v
+            increment = self._get_snapshot_increment(next_cell_date)
+            # Cache even empty increments, so they're known-empty at expiry.
+            increment_cache[num_window_dates + i] = increment
+            if increment:
+                working_snapshot.update(increment)
+
+    @property
+    def snapshot_master(self) -> SnapshotMaster:
+        if self._snapshot_master is None:
+            self._open_snapshots()
+        return self._snapshot_master
+
+    @snapshot_master.setter
+    def snapshot_master(self, value: Optional[SnapshotMaster]) -> None:
+        self._snapshot_master = value
+
+    @property
+    def snapshot_dates(self) -> DateSet:
+        if self._snapshot_dates is None:
+            self._open_snapshots()
+        return self._snapshot_dates
+
+    @snapshot_dates.setter
+    def snapshot_dates(self, value: Optional[DateSet]) -> None:
+        self._snapshot_dates = value
+
+    def _open_snapshots(self) -> None:
+        """Load up the snapshot data, from disk."""
+        self._snapshot_master = SnapshotMaster(
+            "SNAPSHOT_{}:{}".format(self.table.prefix, self.name),
+            self.readonly)
+        self._snapshot_dates = DateSet(
+            "SNAPSHOT_{}:{}".format(self.table.prefix, self.name),
+            self.readonly)
+
+        self._snapshot_master.open()
+        self._snapshot_dates.open()
 
     def open(self, table: Table, readonly: bool = False) -> None:
-        """Load up the snapshot data, from disk."""
-        super().open(table, readonly=readonly)
+        """Prepare to load the snapshot data.
 
-        self.snapshot_master = SnapshotMaster(
-            "SNAPSHOT_{}:{}".format(self.table.prefix, self.name), readonly)
-        self.snapshot_dates = DateSet(
-            "SNAPSHOT_{}:{}".format(self.table.prefix, self.name), readonly)
+        The snapshot data isn't read from disk until it's first used, so that
+        opening a table just to read cells never touches the snapshot files.
+        """
+        super().open(table, readonly=readonly)
 
-        self.snapshot_master.open()
-        self.snapshot_dates.open()
+        self._snapshot_master = None
+        self._snapshot_dates = None
 
     def close(self) -> None:
         """Save off the snapshot data. from disk."""
         if self.readonly:
             return
 
-        self.snapshot_master.close()
-        self.snapshot_dates.close()
+        # If the snapshots were never loaded, then there's nothing to save.
+        if self._snapshot_master is not None:
+            self._snapshot_master.close()
+        if self._snapshot_dates is not None:
+            self._snapshot_dates.close()
 
         # Clear.
-        self.snapshot_master = None
-        self.snapshot_dates = None
+        self._snapshot_master = None
+        self._snapshot_dates = None
 
         # Should clear reference to table.
         super().close()
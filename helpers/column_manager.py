@@ -66,8 +66,11 @@ dependencies are updated after that column.
 """
 
 import os
+import pickle
+import shutil
+import tempfile
 from collections import defaultdict
-from typing import Iterator, Tuple
+from typing import FrozenSet, Iterator, Optional, Tuple
 
 import dill
 from cell_header import *
@@ -82,12 +85,17 @@ def delete_dataset(prefix: Text) -> None:
     Arguments:
         prefix: The prefix of the files we want to delete.
     """
-    # Look in DATE_SET_DIR for any files corresponding to the passed prefix.
-    for root, _, files in os.walk(os.path.join("..", COLUMN_FILES_DIR)):
-        for file in files:
-            if file.find("{}_".format(prefix)) == -1:
-                continue
-            os.remove(os.path.join(root, file))
+    # Look in COLUMN_FILES_DIR for any files corresponding to the passed prefix.
+    # The files are all saved directly in the directory, so don't walk below
+    # it.
+    if not os.path.isdir(COLUMN_FILES_DIR):
+        return
+    # Column files and the dependencies file are both named "{prefix}-...".
+    file_start = "{}-".format(prefix)
+    with os.scandir(COLUMN_FILES_DIR) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.startswith(file_start):
+                os.remove(entry.path)
 
 
 def recover_from_backup(prefix: Text) -> None:
@@ -101,16 +109,34 @@ def recover_from_backup(prefix: Text) -> None:
         prefix: Identifies the table that the column data belongs to.  Also the
             prefix to all the files.
     """
-    for root, _, files in os.walk(os.path.join("..", COLUMN_FILES_DIR)):
-        for file in files:
-            if file.find(prefix) == -1:
-                continue
-            new_path = "{}_{}".format(os.path.join(root, file), BACKUP)
-            old_path = os.path.join(root, file)
-            with open(new_path, "rb") as f:
-                this_column = dill.load(f)
-            with open(old_path, "wb") as f:
-                dill.dump(this_column, f)
+    root = COLUMN_FILES_DIR
+    if not os.path.isdir(root):
+        return
+    # List the files first, because temporary files are made as we go.
+    with os.scandir(root) as it:
+        files = [entry.name for entry in it if entry.is_file()]
+    file_start = "{}-".format(prefix)
+    backup_suffix = "_{}".format(BACKUP)
+    for file in files:
+        if not file.startswith(file_start):
+            continue
+        # Work from the backups, so that the main files aren't copied onto
+        # themselves.
+        if not file.endswith(backup_suffix):
+            continue
+        # The backup already holds the pickled column, so copy the bytes
+        # rather than loading and re-saving it.  Copy to a temporary file
+        # first, then swap it in, so that a crash mid-copy never leaves the
+        # main file truncated.
+        backup_path = os.path.join(root, file)
+        fd, temp_path = tempfile.mkstemp(dir=root)
+        os.close(fd)
+        try:
+            shutil.copyfile(backup_path, temp_path)
+            os.replace(temp_path, backup_path[:-len(backup_suffix)])
+        except BaseException:
+            os.remove(temp_path)
+            raise
 
 
 class ColumnManager(object):
@@ -137,6 +163,9 @@ class ColumnManager(object):
             keyed by the name of those columns.  Keys only exist for columns that
             have been accessed at least once.  Should be accessed through
             get_column.
+        _unloaded: A dict whose values are the paths of column files that have
+            been found but not yet loaded, keyed by the name of the column.
+            Columns move from here to _columns on first access.
         _opened: The set of the columns that have been opened.
         dependency_graph: A dict whose keys are column names, and the values are
             sets containing the names of the columns which depend on the column
@@ -148,6 +177,10 @@ class ColumnManager(object):
             columns should be updated so that any column"s dependencies are
             updated after that column.  Intended to be directly accessed
             externally.
+        _dependency_edges: The edges of dependency_graph as of the last time
+            that refresh_order was calculated.
+        _dependencies_stale: Raised when a column that's already been added
+            gains a dependency, so refresh_order needs recalculating.
     """
 
     def __init__(self, prefix: Text, readonly: bool = False):
@@ -155,6 +188,7 @@ class ColumnManager(object):
         self.readonly = readonly
 
         self._columns: Dict[ColumnName, Column] = dict()
+        self._unloaded: Dict[ColumnName, Text] = dict()
         self._opened: Set[ColumnName] = set()
 
         self.dependency_graph: DefaultDict[ColumnName, Set[ColumnName]] = \
@@ -163,60 +197,167 @@ class ColumnManager(object):
                                                    Set[ColumnName]] = \
             defaultdict(set)
         self.refresh_order: List[ColumnName] = list()
+        self._dependency_edges: Optional[FrozenSet] = None
+        self._dependencies_stale = False
 
     def __contains__(self, col: ColumnName) -> bool:
-        """True if col is in self._columns"""
-        return col in self._columns
+        """True if col is in self._columns, or waiting to be loaded."""
+        return col in self._columns or col in self._unloaded
+
+    def _load_column(self, key: ColumnName) -> None:
+        """Load the column from disk, if it hasn't been loaded yet."""
+        if key in self._unloaded:
+            column = self._load_file(self._unloaded.pop(key))
+            self._columns[key] = column
+            self.dependency_graph[key] = column.dependencies()
 
     def get_column(self, key: ColumnName) -> Column:
-        """Lazy open the columns as needed."""
+        """Lazy load and open the columns as needed."""
         if key not in self._opened:
+            self._load_column(key)
             self._columns[key].open(self.table, readonly=self.readonly)
             self._opened.add(key)
 
         return self._columns[key]
 
     def items(self) -> Iterator[Tuple[ColumnName, Column]]:
-        """Forwards the .items() function from _columns."""
+        """Forwards the .items() function from _columns, loading any columns
+        that haven't been loaded yet."""
+        for k in list(self._unloaded.keys()):
+            self._load_column(k)
         for k, v in self._columns.items():
             yield k, v
 
-    def add_column(self, column: Column) -> ColumnName:
+    def add_column(self, column: Column,
+                   defer_refresh: bool = False) -> ColumnName:
         """Adds a column.
 
         Keep a reference to the column, indexed by the name of the column.
 
         Arguments:
             column: The column that we want to add.
+            defer_refresh: If raised, don't recalculate the refresh order.  Use
+                this when adding many columns at once, then call
+                update_dependencies after the last one.
 
         Returns:
             The new columns name.
         """
-        if column.name in self._columns:
+        if column.name in self:
             # Already added.  Do nothing.  Trust user to not create multiple
             # different columns with the same name.
             return column.name
+        if column.name == COLUMN_DEPENDENCIES_FILE:
+            # Would be saved over the dependencies file.
+            raise ValueError("Reserved column name.")
         self._columns[column.name] = column  # Store by name
 
         # Calculate the refresh order by given the dependency graph.
-        self._update_column_dependencies()
+        if defer_refresh:
+            self._dependencies_stale = True
+        else:
+            self._insert_column_dependencies(column)
 
         return column.name
 
+    def _insert_column_dependencies(self, column: Column) -> None:
+        """Add a new column to the refresh order, without a full sort if we
+        can help it.
+
+        A new column can go at the end of the refresh order if no known column
+        depends on it, or at the start if it depends on no other column.
+        Otherwise, falls back to _update_column_dependencies.  Like that
+        function, this assumes the other columns' dependencies haven't
+        changed, except to add the new column.
+        """
+        name = column.name
+        children = {k for k in column.dependencies()
+                    if k != name and k in self.dependency_graph}
+        parents = {k for k, deps in self.dependency_graph.items()
+                   if k != name and name in deps}
+
+        if (children and parents) or name in column.dependencies():
+            # The full sort also catches a column that depends on itself.
+            self._update_column_dependencies()
+            return
+
+        self.dependency_graph[name] = column.dependencies()
+        for k in column.dependencies():
+            self.reverse_dependency_graph[k].add(name)
+        for k in parents:
+            self.reverse_dependency_graph[name].add(k)
+        if children:
+            self.refresh_order.insert(0, name)
+        else:
+            self.refresh_order.append(name)
+        # The graph has changed, so the next update mustn't be skipped.
+        self._dependency_edges = None
+
+    def add_dependency(self, col: ColumnName, dependent: ColumnName) -> None:
+        """Records that the dependent column should be refreshed whenever col
+        is updated.
+
+        If the dependent column hasn't been added yet, adding it will place it
+        in the refresh order.  Otherwise, the refresh order is recalculated on
+        the next update_dependencies.
+
+        Arguments:
+            col: The name of the column that's depended on.
+            dependent: The name of the column that depends on col.
+        """
+        self.get_column(col)._column_dependencies.add(dependent)
+        if dependent in self:
+            self._dependencies_stale = True
+
+    def update_dependencies(self) -> None:
+        """Bring the dependency graphs and refresh order up to date.
+
+        Only does work if a column was added with defer_refresh, or gained a
+        dependency through add_dependency after it was added.  A change made
+        directly to a column's _column_dependencies needs a call to
+        _update_column_dependencies.
+        """
+        if self._dependencies_stale:
+            self._update_column_dependencies()
+
     def _update_column_dependencies(self) -> None:
-        """Calculate the refresh order by given the dependency graph."""
+        """Calculate the refresh order by given the dependency graph.
+
+        Columns that haven't been loaded keep the dependencies that were saved
+        for them on the last close.
+        """
+        self._dependencies_stale = False
         for k, v in self._columns.items():
             # accessed to reset all columns because the dependencies may have
             # changed.
             self.dependency_graph[k] = v.dependencies()
-            for vi in v.dependencies():
+
+        # Nothing more to do if the graph hasn't changed since last time.
+        dependency_edges = frozenset(
+            (k, frozenset(deps)) for k, deps in self.dependency_graph.items())
+        if dependency_edges == self._dependency_edges:
+            return
+        self._dependency_edges = dependency_edges
+
+        # Rebuild rather than add to the reverse graph, so that removed edges
+        # don't linger.
+        self.reverse_dependency_graph = defaultdict(set)
+        for k, deps in self.dependency_graph.items():
+            for vi in deps:
                 self.reverse_dependency_graph[vi].add(k)
         self.refresh_order = topological(self.dependency_graph)
 
     def _walk_files(self):
-        """Pass through to os.walk on DATE_SET_DIR."""
-        for root, _, files in os.walk(os.path.join("..", COLUMN_FILES_DIR)):
-            yield (root, files)
+        """Yields the files in COLUMN_FILES_DIR, in the form of os.walk.
+
+        The files are all saved directly in the directory, so this doesn't
+        walk below it.
+        """
+        if not os.path.isdir(COLUMN_FILES_DIR):
+            return
+        with os.scandir(COLUMN_FILES_DIR) as it:
+            files = [entry.name for entry in it if entry.is_file()]
+        yield (COLUMN_FILES_DIR, files)
 
     def _load_file(self, path: Text) -> Column:
         """Load the dict from the passed path.  Return an empty dict if path
@@ -232,35 +373,71 @@ class ColumnManager(object):
         if self.readonly:
             raise PermissionError("Cannot modify a readonly.")
 
+        # Plain pickle is much faster than dill, but columns may hold
+        # functions (like SimpleFormula.f) that only dill can save.  Plain
+        # pickle saves functions and classes from a script's __main__ by
+        # name, without error, and another process can't find them there.
+        # So those go through dill too, which saves them by value.  dill can
+        # load either.
+        try:
+            data = pickle.dumps(object, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, AttributeError, TypeError):
+            data = None
+        if data is None or b"__main__" in data:
+            data = dill.dumps(object, protocol=pickle.HIGHEST_PROTOCOL)
         with open(path, "wb") as f:
-            dill.dump(object, f)
+            f.write(data)
+
+    def _dependencies_file(self) -> Text:
+        """The name of the file that saves the dependencies of every column.
+
+        It's named like the column files, so that no column may share its name.
+        """
+        return "{}-{}".format(self.prefix, COLUMN_DEPENDENCIES_FILE)
 
     def open(self, table: 'Table') -> None:
-        """Load up any existing columns.
+        """Find any existing columns.
 
-        Looks through the column files to see if any match the prefix, and loads
-        them.  Then calls open on those columns to do any supplemental loading
-        if accesseded.
+        Looks through the column files to see if any match the prefix.  If the
+        dependencies of a column were saved on the last close, then the column
+        isn't loaded until it's first accessed; otherwise it's loaded now.
+        Calls open on the columns to do any supplemental loading if accessed.
         """
         # Hold a pointer to the table.
         self.table = table
 
+        column_paths: Dict[ColumnName, Text] = dict()
+        saved_dependencies: Dict[ColumnName, Set[ColumnName]] = dict()
+        column_file_start = "{}-".format(self.prefix)
         for root, files in self._walk_files():
             for file in files:
-                if file.find(self.prefix) == -1:
-                    continue
-                col_path = os.path.join(root, file)
+                file_name = os.path.basename(file)
+                if file_name == self._dependencies_file():
+                    saved_dependencies = self._load_file(
+                        os.path.join(root, file))
+                elif file_name.startswith(column_file_start):
+                    column_paths[file_name[len(column_file_start):]] = \
+                        os.path.join(root, file)
+
+        for name, col_path in column_paths.items():
+            if name in saved_dependencies:
+                self._unloaded[name] = col_path
+                self.dependency_graph[name] = saved_dependencies[name]
+            else:
                 new_column = self._load_file(col_path)
-                self._columns[file.split("-")[1]] = new_column
-                self.add_column(new_column)
+                self.add_column(new_column, defer_refresh=True)
 
+        # Calculate the refresh order once, for all the columns.
         self._update_column_dependencies()
 
     def close(self) -> None:
         """Save off columns.
 
         Calls close() on the columns, which will save and clear supplemental
-        data, then saves to the column files with the prefix.
+        data, then saves to the column files with the prefix.  Columns that
+        were never loaded are unchanged, so aren't saved again.  The
+        dependencies of every column are saved alongside, so that the next
+        open doesn't need to load the columns.
         """
         if self.readonly:
             return
@@ -270,15 +447,22 @@ class ColumnManager(object):
         for k, v in self._columns.items():
             if k in self._opened:
                 v.close()
-            write_path = os.path.join(
-                COLUMN_FILES_DIR, "{}-{}".format(self.prefix, k))
-            self._save_file(v, write_path)
+
+        dependencies = {k: set(v) for k, v in self.dependency_graph.items()
+                        if k in self}
+
+        for k, v in self._columns.items():
+            self._save_file(v, os.path.join(
+                COLUMN_FILES_DIR, "{}-{}".format(self.prefix, k)))
+        self._save_file(dependencies,
+                        os.path.join(COLUMN_FILES_DIR, self._dependencies_file()))
 
         # Clear
         self.table = None
         self.prefix = None
         self.readonly = None
         self._columns= None
+        self._unloaded = None
         self._opened= None
         self.dependency_graph = None
         self.reverse_dependency_graph = None
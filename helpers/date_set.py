@@ -24,6 +24,12 @@ keys and CellKey values, with push_date adding to both.  The list (dates) and
 dict (dates_keys) are publicly available.  There's also logic for how to load
 and save from a "prefix" name, passed at initialization.
 
+Rather than saving the whole DateSet on every close, the pushes since the last
+save are appended to a journal file, which is replayed on open.  Once the
+journal gets long (JOURNAL_COMPACT_SIZE), the full DateSet is saved again and
+the journal is emptied.  The journal has a backup like the other files, so the
+backups always describe the same DateSet as each other.
+
     Typical usage example:
 
     >>> my_date_set = DateSet("test_filepath_prefix")
@@ -49,10 +55,13 @@ and save from a "prefix" name, passed at initialization.
     >>> delete_dataset("test_filepath_prefix")
 """
 
+import bisect
 import os
 import pickle
 from collections import defaultdict
-from typing import Optional
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
 
 from cell_header import *
 
@@ -66,11 +75,15 @@ def delete_dataset(prefix: Text) -> None:
         prefix: The prefix of the files we want to delete.
     """
     # Look in DATE_SET_DIR for any files corresponding to the passed prefix.
-    for root, _, files in os.walk(os.path.join("..", DATE_SET_DIR)):
-        for file in files:
-            if file.find("{}_".format(prefix)) == -1:
-                continue
-            os.remove(os.path.join(root, file))
+    # The files are all saved directly in the directory, so don't walk below
+    # it.
+    if not os.path.isdir(DATE_SET_DIR):
+        return
+    file_start = "{}_".format(prefix)
+    with os.scandir(DATE_SET_DIR) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.startswith(file_start):
+                os.remove(entry.path)
 
 
 class DateSet(object):
@@ -92,6 +105,13 @@ class DateSet(object):
             set of the CellKeys for that date.
         dates: An ordered list with all the Dates we've added.  We maintain
             the order as we add new dates
+        _dates_array: A copy of dates as an int64 numpy array, or None if it
+            needs to be rebuilt.  Should be accessed through dates_array.
+        _dates_array_source: The dates list that _dates_array was copied from.
+        _journal: The (date, cell_key) pairs pushed since opening, which still
+            need to be written to the journal file.
+        _journal_length: The number of pairs already in the journal file, or
+            None if the full DateSet has never been saved.
     """
 
     def __init__(self, prefix: Text, readonly: bool = False):
@@ -100,32 +120,36 @@ class DateSet(object):
 
         self.dates_keys: DefaultDict[Date, Set[CellKey]] = defaultdict(set)
         self.dates: List[Date] = list()
+        self._dates_array: Optional[np.ndarray] = None
+        self._dates_array_source: Optional[List[Date]] = None
+        self._journal: List[Tuple[Date, CellKey]] = list()
+        self._journal_length: Optional[int] = None
+
+    def dates_array(self) -> np.ndarray:
+        """Returns the dates as a sorted int64 numpy array.
 
-    def smallest_ind_gt_date(self, date: Date, st: Optional[Date] = None,
-                              en: Optional[Date] = None) -> int:
+        The array is built on first use, and kept until a new date is added.
+        It should not be modified.
+        """
+        # Also rebuild if dates has been replaced or changed directly.
+        if self._dates_array is None or \
+                self._dates_array_source is not self.dates or \
+                len(self._dates_array) != len(self.dates):
+            self._dates_array = np.array(self.dates, dtype=np.int64)
+            self._dates_array_source = self.dates
+        return self._dates_array
+
+    def smallest_ind_gt_date(self, date: Date) -> int:
         """A simple binary search, which returns the index of the smallest date
         which is greater than the passed date.
 
         Arguments:
             date: The date that we're targeting.
-            st: Used in the binary search, should not be set on call.
-            en: Used in the binary search, should not be set on call.
 
         Returns:
             The index of the smallest date that is greater than the passed date.
         """
-        if st is None:
-            st = 0
-        if en is None:
-            en = len(self.dates)
-
-        if st == en:
-            return st
-
-        m = (st + en) // 2
-        if self.dates[m] > date:
-            return self.smallest_ind_gt_date(date, st, m)
-        return self.smallest_ind_gt_date(date, m + 1, en)
+        return bisect.bisect_right(self.dates, date)
 
     def slice(self, st_date: Optional[Date] = None,
               en_date: Optional[Date] = None) -> List[Date]:
@@ -140,25 +164,45 @@ class DateSet(object):
         Returns:
             A (sorted) list of the dates between st_date and en_date (inclusive)
         """
-        if len(self.dates) == 0:
-            return []
-
         if st_date is None:
             st_ind = 0
         else:
-            st_ind = self.smallest_ind_gt_date(st_date)
-            # This may miss a date that is equal, since gt_date is a strict
-            # inequality.
-            if st_ind > 0 and self.dates[st_ind - 1] == st_date:
-                st_ind -= 1
+            st_ind = bisect.bisect_left(self.dates, st_date)
 
         if en_date is None:
             en_ind = len(self.dates)
         else:
-            en_ind = self.smallest_ind_gt_date(en_date)
+            en_ind = bisect.bisect_right(self.dates, en_date)
 
         return self.dates[st_ind:en_ind]
 
+    def slice_array(self, st_date: Optional[Date] = None,
+                    en_date: Optional[Date] = None) -> np.ndarray:
+        """Same as slice, but returns the dates as an int64 numpy array.
+
+        The result is a view on dates_array, so should not be modified.
+
+        Arguments:
+            st_date: Lower bound of dates in response.
+            en_date: Upper bound of dates in response.
+
+        Returns:
+            A sorted array of the dates between st_date and en_date (inclusive)
+        """
+        dates_array = self.dates_array()
+
+        if st_date is None:
+            st_ind = 0
+        else:
+            st_ind = np.searchsorted(dates_array, st_date, side="left")
+
+        if en_date is None:
+            en_ind = len(dates_array)
+        else:
+            en_ind = np.searchsorted(dates_array, en_date, side="right")
+
+        return dates_array[st_ind:en_ind]
+
     def push_date(self, date: Date, cell_key: CellKey) -> None:
         """Inserts a date into both dates_keys and dates (in order).
         
@@ -167,24 +211,89 @@ class DateSet(object):
         """
         if self.readonly:
             raise PermissionError("Cannot modify a readonly.")
-            
-        date_already_encountered = (date in self.dates_keys)
-        self.dates_keys[date].add(cell_key)
-        if date_already_encountered:
-            # Stop here.
-            return
 
-        if len(self.dates) == 0:
-            self.dates = [date]
-            return
+        if self._insert_date(date, cell_key):
+            self._journal.append((date, cell_key))
+
+    def push_dates(self, pairs: Iterable[Tuple[Date, CellKey]]) -> None:
+        """Same as calling push_date on each (date, cell_key) pair.
 
-        ind = self.smallest_ind_gt_date(date)
-        self.dates = self.dates[:ind] + [date] + self.dates[ind:]
+        The new dates are sorted into dates all at once, rather than one at a
+        time, so this is faster for many out-of-order dates.
+
+        Arguments:
+            pairs: The (date, cell_key) pairs that we want to add.
+        """
+        if self.readonly:
+            raise PermissionError("Cannot modify a readonly.")
+
+        self._journal.extend(self._insert_dates(pairs))
+
+    def _insert_dates(self, pairs: Iterable[Tuple[Date, CellKey]]
+                      ) -> List[Tuple[Date, CellKey]]:
+        """Does the work of push_dates, without writing to the journal.
+
+        Returns:
+            The pairs whose cell_key wasn't already in dates_keys for the date.
+        """
+        inserted = list()
+        new_dates = list()
+        for date, cell_key in pairs:
+            keys = self.dates_keys.get(date)
+            if keys is None:
+                self.dates_keys[date] = {cell_key}
+                new_dates.append(date)
+            elif cell_key not in keys:
+                keys.add(cell_key)
+            else:
+                continue
+            inserted.append((date, cell_key))
+
+        if new_dates:
+            # Sorting merges the two sorted runs in linear time.
+            new_dates.sort()
+            extend_only = not self.dates or new_dates[0] > self.dates[-1]
+            self.dates.extend(new_dates)
+            if not extend_only:
+                self.dates.sort()
+            self._dates_array = None
+        return inserted
+
+    def _insert_date(self, date: Date, cell_key: CellKey) -> bool:
+        """Does the work of push_date, without writing to the journal.
+
+        Returns:
+            True if the cell_key wasn't already in dates_keys for the date.
+        """
+        keys = self.dates_keys.get(date)
+        if keys is not None:
+            # Date already encountered, so dates doesn't change.
+            if cell_key in keys:
+                return False
+            keys.add(cell_key)
+            return True
+        self.dates_keys[date] = {cell_key}
+
+        # Dates usually arrive in order, so check for an append first.
+        # Otherwise insert in place, keeping the order.
+        if not self.dates or date > self.dates[-1]:
+            self.dates.append(date)
+        else:
+            bisect.insort(self.dates, date)
+        self._dates_array = None
+        return True
 
     def _walk_files(self):
-        """Pass through to os.walk on DATE_SET_DIR."""
-        for root, _, files in os.walk(os.path.join("..", DATE_SET_DIR)):
-            yield (root, files)
+        """Yields the files in DATE_SET_DIR, in the form of os.walk.
+
+        The files are all saved directly in the directory, so this doesn't
+        walk below it.
+        """
+        if not os.path.isdir(DATE_SET_DIR):
+            return
+        with os.scandir(DATE_SET_DIR) as it:
+            files = [entry.name for entry in it if entry.is_file()]
+        yield (DATE_SET_DIR, files)
 
     def _load_file(self, path: Text) -> Any:
         """Pass through to pickle.load"""
@@ -196,48 +305,106 @@ class DateSet(object):
         """Pass through to pickle.dump"""
         if self.readonly:
             raise PermissionError("Cannot modify a readonly.")
-            
+
         with open(path, "wb") as f:
-            pickle.dump(object, f)
+            pickle.dump(object, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _append_file(self, records: List[Tuple[Date, CellKey]],
+                     path: Text) -> None:
+        """Pickle the records onto the end of the journal at path."""
+        if self.readonly:
+            raise PermissionError("Cannot modify a readonly.")
+
+        with open(path, "ab") as f:
+            f.write(pickle.dumps(records, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _load_journal(self, path: Text) -> List[Tuple[Date, CellKey]]:
+        """Load all the records from the journal at path.
+
+        The journal is a run of pickled lists, one for each append.
+        """
+        result = list()
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    result.extend(pickle.load(f))
+                except EOFError:
+                    break
+        return result
 
     def open(self) -> None:
         """Loads the dates and dates_keys dict from disk.
 
-        Looks in DATE_SET_DIR for any files corresponding to the passed prefix.
+        Looks in DATE_SET_DIR for any files corresponding to the passed prefix,
+        then replays the journal on top of these.
         """
+        # Only the primary copies are loaded, never the backups.
+        dates_file = "{}_{}".format(self.prefix, DATES_FILE)
+        dates_set_file = "{}_{}".format(self.prefix, DATES_SET_FILE)
+        journal_file = "{}_{}".format(self.prefix, DATES_JOURNAL_FILE)
+        journal_path = None
         for root, files in self._walk_files():
             for file in files:
-                if file.find("{}_".format(self.prefix)) == -1:
-                    continue
-                if file.find("_{}".format(DATES_FILE)) != -1:
+                file_name = os.path.basename(file)
+                if file_name == dates_file:
                     self.dates = self._load_file(os.path.join(root, file))
-                if file.find("_{}".format(DATES_SET_FILE)) != -1:
+                    self._dates_array = None
+                    self._journal_length = 0
+                elif file_name == dates_set_file:
                     self.dates_keys = self._load_file(
                         os.path.join(root, file))
+                elif file_name == journal_file:
+                    journal_path = os.path.join(root, file)
+
+        if journal_path is not None and self._journal_length is not None:
+            records = self._load_journal(journal_path)
+            self._insert_dates(records)
+            self._journal_length = len(records)
 
     def close(self) -> None:
         """Upon closing, save the files for the function.
-        
-        Saves both a primary and a backup for both the dates list and for
-        the dates_keys.  Uses the stored prefix to decide the files' paths.
+
+        Usually this only appends the new dates to the journal.  If the full
+        DateSet hasn't been saved yet, or the journal has grown too long, then
+        instead saves both a primary and a backup for both the dates list and
+        for the dates_keys, and empties the journal.  The journal's backup is
+        kept in step with the journal.  Uses the stored prefix to decide the
+        files' paths.
         """
         if self.readonly:
             return
-            
+
         dates_path = os.path.join(
             DATE_SET_DIR, "{}_{}".format(self.prefix, DATES_FILE))
         dates_set_path = os.path.join(
             DATE_SET_DIR, "{}_{}".format(self.prefix, DATES_SET_FILE))
+        journal_path = os.path.join(
+            DATE_SET_DIR, "{}_{}".format(self.prefix, DATES_JOURNAL_FILE))
+
+        if self._journal_length is not None and \
+                self._journal_length + len(self._journal) <= \
+                JOURNAL_COMPACT_SIZE:
+            if self._journal:
+                self._append_file(self._journal,
+                                  "{}_{}".format(journal_path, BACKUP))
+                self._append_file(self._journal, journal_path)
+        else:
+            # Save backup copy
+            self._save_file(self.dates, "{}_{}".format(dates_path, BACKUP))
+            self._save_file(self.dates_keys,
+                            "{}_{}".format(dates_set_path, BACKUP))
+            self._save_file(list(), "{}_{}".format(journal_path, BACKUP))
 
-        # Save backup copy
-        self._save_file(self.dates, "{}_{}".format(dates_path, BACKUP))
-        self._save_file(self.dates_keys,
-                        "{}_{}".format(dates_set_path, BACKUP))
+            # Save primary copy
+            self._save_file(self.dates, dates_path)
+            self._save_file(self.dates_keys, dates_set_path)
 
-        # Save primary copy
-        self._save_file(self.dates, dates_path)
-        self._save_file(self.dates_keys, dates_set_path)
+            # Everything in the journal is now in the primary copies.
+            self._save_file(list(), journal_path)
 
         # Clear
         self.dates_keys = defaultdict(set)
         self.dates = list()
+        self._dates_array = None
+        self._journal = list()
+        self._journal_length = None
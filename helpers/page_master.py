@@ -58,14 +58,30 @@ implementation.
     >>> delete_pagemanager("test_prefix")  # Clean up
 """
 
+import ast
 import os
 import pickle
-from typing import Generic, Dict, TypeVar, Optional
+import re
+from collections import OrderedDict
+from typing import Generic, Dict, Hashable, Tuple, TypeVar, Optional
 
 from cell_header import *
 
-# Must have __str__ implemented.
+# Must be hashable, and have __str__ implemented.
 Addr = TypeVar("Addr")
+# Pages are kept in the cache by name.  The name is only made into a string
+# for the page's file name.
+PageName = Hashable
+
+# Returned by get_value for keys without a value.  Only ever checked with
+# isinstance, so one instance is shared rather than making one per lookup.
+_MISSING = NoneClass()
+
+# How CellMaster pages used to key their entries, before they were split by
+# address.
+_OLD_CELL_KEY = re.compile(
+    r"CellAddr\(date=(\d+), col=('(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\")\): "
+    r"(.*)", re.DOTALL)
 
 
 def delete_pagemanager(prefix: Text) -> None:
@@ -76,12 +92,15 @@ def delete_pagemanager(prefix: Text) -> None:
     Arguments:
         prefix: The prefix of the files we want to delete.
     """
-    # Look in DATE_SET_DIR for any files corresponding to the passed prefix.
-    for root, _, files in os.walk(os.path.join(CELL_FILES_DIR)):
-        for file in files:
-            if file.find("{}_".format(prefix)) == -1:
-                continue
-            os.remove(os.path.join(root, file))
+    # Look in CELL_FILES_DIR for any files corresponding to the passed prefix.
+    # Pages are all saved directly in the directory, so don't walk below it.
+    if not os.path.isdir(CELL_FILES_DIR):
+        return
+    file_start = "{}_".format(prefix)
+    with os.scandir(CELL_FILES_DIR) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.startswith(file_start):
+                os.remove(entry.path)
 
 
 class PageMaster(Generic[Addr]):
@@ -89,7 +108,8 @@ class PageMaster(Generic[Addr]):
 
     The class has a get and a set method both of which take a key along with
     the address for the key.  An internal function maps the address to a
-    "page."  The page is loaded up from disk, and is modified locally. The
+    "page," a dict holding a dict of keys to values for each address on the
+    page.  The page is loaded up from disk, and is modified locally. The
     most recently-used pages are kept and modified locally.  After a page
     hasn't been used for a long enough time (determined by cache_size),
     the modified local version is saved back to disk, overwriting, and it is
@@ -100,31 +120,40 @@ class PageMaster(Generic[Addr]):
             table.  This is attached to the file names.
         readonly: If raised, may only read from the table.  Saves time on
             closing.
-        cache: This stores the most-recently used pages locally.
+        cache: This stores the most-recently used pages locally, keyed by page
+            name, and ordered from most- to least-recently used.
         casche_size: The number of pages that we want to keep in the cache.
+        _last_page_name: The name of the page that was most recently used, or
+            None.  This page is always at the front of the cache.
+        _last_page: The page that was most recently used, or None.
+        _dirty_pages: The names of the pages in the cache that have been
+            modified since they were loaded.  Only these are saved.
     """
 
     def __init__(self, prefix: Text, cache_size: int = 80, readonly: bool = False):
         self.prefix = prefix
         self.readonly = readonly
-        self.cache = list()
+        self.cache = OrderedDict()
         self.cache_size = cache_size
+        self._last_page_name: Optional[PageName] = None
+        self._last_page: Optional[Dict] = None
+        self._dirty_pages: Set[PageName] = set()
 
     def get_value(self, addr: Addr, key: Text) -> Optional[Any]:
         """Returns the value stored for the key at the address.
 
-        Swallows any failures, returning None instead.
-
         Arguments:
             addr: The address tells the locality.
             key: The key for which to return the value.
 
         Returns:
-            The value assigned to the key.  Or NoneClass, if no value exists, or
-                there was an error.
+            The value assigned to the key.  Or NoneClass, if no value exists.
         """
         page = self._get_page(addr)
-        return page.get(self._addr_key(addr, key), NoneClass())
+        entries = page.get(addr)
+        if entries is None:
+            return _MISSING
+        return entries.get(key, _MISSING)
 
     def set_value(self, addr: Addr, key: Text, value: Any) -> None:
         """Sets the passed value to the key at the address.
@@ -140,25 +169,72 @@ class PageMaster(Generic[Addr]):
             raise PermissionError("Cannot modify a readonly.")
 
         page = self._get_page(addr)
-        page[self._addr_key(addr, key)] = value
-
-    def _addr_key(self, addr: Addr, key: Text) -> Text:
-        """Builds a key from the address and key.
+        entries = page.get(addr)
+        if entries is None:
+            entries = page[addr] = dict()
+        entries[key] = value
+        # _get_page always leaves the page as the last page.
+        self._dirty_pages.add(self._last_page_name)
 
-        We only require that a key be unique with a page address,
-        but multiple addresses may be saved on a single page.  So we will use
-        this function to build a new key from both the address and the key.
+    def set_values(self, addr: Addr, values: Dict[Text, Any]) -> None:
+        """Same as calling set_value for each key and value in values, but
+        only looks up the page once.
 
         Arguments:
-            addr: The address within which we require unique keys.
-            key: The key we want to extend.
+            addr: The address tells the locality.
+            values: The values to assign, keyed by the key to assign them to.
+        """
+        if self.readonly:
+            raise PermissionError("Cannot modify a readonly.")
 
+        if not values:
+            return
+        page = self._get_page(addr)
+        entries = page.get(addr)
+        if entries is None:
+            entries = page[addr] = dict()
+        entries.update(values)
+        self._dirty_pages.add(self._last_page_name)
+
+    def _split_old_key(self, key: Any) -> Optional[Tuple[Addr, Text]]:
+        """Splits a key from a page saved in an older format.
+
+        Pages used to be flat dicts, with the address and key combined into
+        a string for each entry's key.  Now they are two levels deep, by
+        address then key.
+
+        Only the subclasses know what their addresses look like, so the base
+        class treats every page as current.  This function is expected to be
+        overwritten in inheritance, to parse the old string keys.
+
+        Arguments:
+            key: A key from a page just loaded from disk.
         Returns:
-            The extended key built from address and key.
+            The address and key that the old key was built from.  Or None, if
+                the key is current.
         """
-        return "{}: {}".format(str(addr), key)
+        return None
+
+    def _upgrade_page(self, page: Dict) -> bool:
+        """Converts a page saved in an older format, in place.
 
-    def _addr_to_page(self, addr: Addr) -> Text:
+        Arguments:
+            page: A page just loaded from disk.
+        Returns:
+            True if the page needed converting.
+        """
+        # Old pages only ever had one kind of key, so the first is enough.
+        if not page or self._split_old_key(next(iter(page))) is None:
+            return False
+
+        old_items = list(page.items())
+        page.clear()
+        for old_key, value in old_items:
+            addr, key = self._split_old_key(old_key)
+            page.setdefault(addr, dict())[key] = value
+        return True
+
+    def _addr_to_page(self, addr: Addr) -> PageName:
         """Maps the address to a page name.
 
         The page name is used throughout to know where to look for a key stored
@@ -174,6 +250,19 @@ class PageMaster(Generic[Addr]):
         """
         return str(addr)
 
+    def _page_file_name(self, page_name: PageName) -> Text:
+        """Maps the page name to the name of its file, without the prefix.
+
+        This function is expected to be overwritten in inheritance if the page
+        names aren't already suitable.
+
+        Arguments:
+            page_name: The page name, as given by _addr_to_page.
+        Returns:
+            The file name for the page.
+        """
+        return str(page_name)
+
     def _get_page(self, addr: Addr) -> Dict:
         """Get the dict (page) where the addr resides.
 
@@ -188,20 +277,26 @@ class PageMaster(Generic[Addr]):
         """
         page_name = self._addr_to_page(addr)
 
+        # Consecutive accesses are usually to the same page, which is already
+        # at the front of the cache.
+        if page_name == self._last_page_name:
+            return self._last_page
+
         # Check to see if it's in the cache
-        for ci, c in enumerate(self.cache):
-            if c[0] == page_name:
-                # Move that page to the front of the cache, to maintain that the
-                # cache orders by the most-recently used.
-                self.cache = (
-                        [self.cache[ci]] + self.cache[:ci] + self.cache[ci + 1:]
-                )
-                return c[1]
-
-        # The page is not already in the cache, so open it up.
-        return self._load_new_page(page_name)
-
-    def _load_new_page(self, page_name: Text) -> Dict:
+        page = self.cache.get(page_name)
+        if page is not None:
+            # Move that page to the front of the cache, to maintain that the
+            # cache orders by the most-recently used.
+            self.cache.move_to_end(page_name, last=False)
+        else:
+            # The page is not already in the cache, so open it up.
+            page = self._load_new_page(page_name)
+
+        self._last_page_name = page_name
+        self._last_page = page
+        return page
+
+    def _load_new_page(self, page_name: PageName) -> Dict:
         """Load the dict (page) from the file name.
 
         Load from the file name, and insert the page at the beginning of the
@@ -214,19 +309,26 @@ class PageMaster(Generic[Addr]):
         Arguments:
             page_name: The name of the page that we want to load.
         """
-        full_path = os.path.join(CELL_FILES_DIR,
-                                 "{}_{}".format(self.prefix, page_name))
+        full_path = os.path.join(
+            CELL_FILES_DIR,
+            "{}_{}".format(self.prefix, self._page_file_name(page_name)))
         new_dict = self._load_file(full_path)
-        new_cache_entry = (page_name, new_dict)
+        if self._upgrade_page(new_dict):
+            # Save it back in the current format.
+            self._dirty_pages.add(page_name)
 
         # Put the new entry at the front, and delete any overflow
-        self.cache = [new_cache_entry] + self.cache
+        self.cache[page_name] = new_dict
+        self.cache.move_to_end(page_name, last=False)
 
         # If the cache is full then save the last cache, then forget it
-        if len(self.cache) > self.cache_size:
+        while len(self.cache) > self.cache_size:
+            old_name, old_page = self.cache.popitem(last=True)
+            if old_name == self._last_page_name:
+                self._last_page_name = None
+                self._last_page = None
             if not self.readonly:
-                self._save_single_page()
-            self.cache = self.cache[:self.cache_size]
+                self._save_single_page(old_name, old_page)
 
         return new_dict
 
@@ -245,39 +347,41 @@ class PageMaster(Generic[Addr]):
             raise PermissionError("Cannot modify a readonly.")
 
         with open(path, "wb") as f:
-            pickle.dump(object, f)
+            pickle.dump(object, f, protocol=pickle.HIGHEST_PROTOCOL)
 
-    def _save_single_page(self, cache_index: Optional[int] = None) -> None:
-        """Save the dict (page) from the passed slot, into its file.
+    def _save_single_page(self, page_name: PageName, page: Dict) -> None:
+        """Save the dict (page) into the file for its page name.
 
-        If no index is set, then save the least-recently used page (last
-        index); this is used when we're getting ready to forget that page.
+        Does nothing if the page hasn't been modified since it was loaded.
 
         Arguments:
-            cache_index: If set, save the page in that spot of the index; this
-                is used when saving all pages.
+            page_name: The name of the page, which decides the file.
+            page: The dict to save.
         """
         if self.readonly:
             raise PermissionError("Cannot modify a readonly.")
 
-        if cache_index is None:
-            # If not specified, save the last one.  The most common case.
-            cache_index = len(self.cache) - 1
+        if page_name not in self._dirty_pages:
+            return
+        self._dirty_pages.discard(page_name)
 
         save_path = os.path.join(
             CELL_FILES_DIR,
-            "{}_{}".format(self.prefix, self.cache[cache_index][0])
-        )
-        self._save_file(self.cache[cache_index][1], save_path)
+            "{}_{}".format(self.prefix, self._page_file_name(page_name)))
+        self._save_file(page, save_path)
 
     def save_all_and_empty(self) -> None:
         """Save all open pages, and clear the cache."""
         if self.readonly:
             raise PermissionError("Cannot modify a readonly.")
 
-        for i in range(len(self.cache)):
-            self._save_single_page(i)
-        self.cache = []
+        for page_name, page in self.cache.items():
+            if page_name in self._dirty_pages:
+                self._save_single_page(page_name, page)
+        self.cache = OrderedDict()
+        self._last_page_name = None
+        self._last_page = None
+        self._dirty_pages = set()
 
     def open(self):
         """Don't do anything, lazy load."""
@@ -300,10 +404,24 @@ class CellMaster(PageMaster[CellAddr]):
     def __init__(self, prefix: Text, cache_size=80, readonly: bool = False):
         super().__init__(prefix, cache_size=cache_size, readonly=readonly)
 
-    def _addr_to_page(self, cell_addr: CellAddr) -> Text:
+    def _addr_to_page(self, cell_addr: CellAddr) -> Tuple[int, ColumnName]:
         """Set the address so that cells in the same month, same column will be
         on the same page."""
-        return "{}-{}".format(cell_addr.date // 100, cell_addr.col)
+        return cell_addr.date // 100, cell_addr.col
+
+    def _page_file_name(self, page_name: Tuple[int, ColumnName]) -> Text:
+        """Files are named by month and column."""
+        return "{}-{}".format(*page_name)
+
+    def _split_old_key(self,
+                       key: Any) -> Optional[Tuple[CellAddr, CellKey]]:
+        """Current keys are CellAddrs; old keys were strings that look like
+        "CellAddr(date=20110101, col='A'): key"."""
+        if type(key) is not str:
+            return None
+        match = _OLD_CELL_KEY.match(key)
+        return (CellAddr(int(match.group(1)), ast.literal_eval(match.group(2))),
+                match.group(3))
 
 
 class SnapshotMaster(PageMaster[Date]):
@@ -319,9 +437,17 @@ class SnapshotMaster(PageMaster[Date]):
         super().__init__("SNAPSHOT-{}".format(column_name),
                          cache_size=5, readonly=readonly)
 
-    def _addr_to_page(self, addr: Date) -> Text:
+    def _addr_to_page(self, addr: Date) -> Date:
         """Set the address to the start_date."""
-        return str(addr)
+        return addr
+
+    def _split_old_key(self, key: Any) -> Optional[Tuple[Date, Text]]:
+        """Current keys are dates; old keys were strings that look like
+        "20110101: SNAPSHOT"."""
+        if type(key) is not str:
+            return None
+        date, key = key.split(": ", 1)
+        return int(date), key
 
     def get_date_value(self, date: Date) -> Optional[Snapshot]:
         """Returns the value stored for the date.
@@ -346,5 +472,4 @@ class SnapshotMaster(PageMaster[Date]):
             date: Specifies the address of the page we want to write to.
             value: The value to assign.
         """
-        page = self._get_page(date)
-        page[self._addr_key(date, SNAPSHOT_KEY)] = value
\ No newline at end of file
+        self.set_value(date, SNAPSHOT_KEY, value)
\ No newline at end of file
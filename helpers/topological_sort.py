@@ -17,40 +17,16 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-from enum import Enum
-from typing import Dict, List, Optional
+from typing import Dict, List
 
-import attr
-
-
-class Color(Enum):
-    """Used to show step in the DFS.
-
-    When a node is WHITE, it hasn't been visited yet.
-    When a node is GRAY, it has been visited, and we are working on its children.
-    When a node is BLACK, it has been visited, and so has all its children.
-    """
-    
-    WHITE = 1
-    GRAY = 2
-    BLACK = 3
-
-
-@attr.s
-class Node(object):
-    """Properties of nodes that we calculate during a DFS.
-
-    Attributes:
-        start: The step (time) that we first visit a node.
-        finish: The step (time) that we last visit a node, after visiting all
-            its children.
-        color: We color nodes at different points to track where our algorithm
-            is at.  See description above for more details about coloring.
-    """
-
-    start: Optional[int] = attr.ib(default=None)
-    finish: Optional[int] = attr.ib(default=None)
-    color: Color = attr.ib(default=Color.WHITE)
+# Colors show the step in the DFS.
+#
+# When a node is WHITE, it hasn't been visited yet.
+# When a node is GRAY, it has been visited, and we are working on its children.
+# When a node is BLACK, it has been visited, and so has all its children.
+_WHITE = 0
+_GRAY = 1
+_BLACK = 2
 
 
 def topological(graph: Dict) -> List:
@@ -70,56 +46,41 @@ def topological(graph: Dict) -> List:
         ValueError: If a loop is detected.
     """
 
-    nodes = {v: Node() for v in graph.keys()}
-    time = 0
-
-    def set_start(v):
-        """Set the start time on the passed node, and colors GRAY."""
-
-        # Share these variables.
-        nonlocal nodes
-        nonlocal time
-
-        time += 1
-        nodes[v].start = time
-        nodes[v].color = Color.GRAY
-
-    def set_finish(v):
-        """Set the finish time on the passed node, and colors BLACK."""
-
-        # Share these variables.
-        nonlocal nodes
-        nonlocal time
-
-        time += 1
-        nodes[v].finish = time
-        nodes[v].color = Color.BLACK
-
-    def dfs(v):
-        """A standard depth-first-search, which sets start and finish times.
-        (Only finish time is needed, really.) """
-        # Share these variables.
-        nonlocal graph
-        nonlocal nodes
-        nonlocal time
-
-        if nodes[v].color == Color.GRAY:
-            raise ValueError("Loop found.")
-
-        set_start(v)
-        for dep in graph[v]:
-            if dep not in nodes:
-                # This is means that the dependency is not a recognized node.
-                continue
-            if nodes[dep].color != Color.BLACK:
-                dfs(dep)
-        set_finish(v)
-
-    for v in graph.keys():
-        if nodes[v].color == Color.WHITE:
-            dfs(v)
-
-    # Sort keys by finish time in descending order.
-    key_finishes = [(k, v.finish) for k, v in nodes.items()]
-    key_finishes.sort(key=lambda x: -x[1])
-    return [x[0] for x in key_finishes]
+    color = {v: _WHITE for v in graph.keys()}
+    # Nodes in the order that they finish.
+    finish_order = list()
+
+    # A standard depth-first-search, which records the order that nodes
+    # finish.  Rather than recursing, we keep a stack of the nodes we're
+    # working on, along with an iterator over the children that remain to
+    # visit for each.
+    for root in graph.keys():
+        if color[root] != _WHITE:
+            continue
+
+        color[root] = _GRAY
+        stack = [(root, iter(graph[root]))]
+
+        while stack:
+            v, children = stack[-1]
+            for dep in children:
+                dep_color = color.get(dep)
+                if dep_color is None:
+                    # This is means that the dependency is not a recognized
+                    # node.
+                    continue
+                if dep_color == _GRAY:
+                    raise ValueError("Loop found.")
+                if dep_color == _WHITE:
+                    color[dep] = _GRAY
+                    stack.append((dep, iter(graph[dep])))
+                    break
+            else:
+                # All the children are done.
+                stack.pop()
+                color[v] = _BLACK
+                finish_order.append(v)
+
+    # Order keys by finish time in descending order.
+    finish_order.reverse()
+    return finish_order
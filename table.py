@@ -24,6 +24,26 @@ from helpers.date_set import *
 from helpers.page_master import *
 
 
+def _same_value(old: Any, new: Any) -> bool:
+    """Checks whether a cell holding old would be unchanged by setting new.
+
+    Values only match if they have the same type, so that (for example) 1 is
+    not left in place of 1.0.  Numpy scalars are compared as the Python
+    numbers they hold, so 100 matches numpy.int64(100).  Values that can't be
+    compared to a single bool (like numpy arrays) never match.
+    """
+    if isinstance(old, np.generic):
+        old = old.item()
+    if isinstance(new, np.generic):
+        new = new.item()
+    if type(old) is not type(new):
+        return False
+    try:
+        return bool(old == new)
+    except (TypeError, ValueError):
+        return False
+
+
 class Table(object):
     """A cell-link table.
 
@@ -55,8 +75,8 @@ class Table(object):
             update order.
         ds: A DateSet used to store all the dates we have data for.
         need_refresh: A dictionary telling which cell addresses need refreshing.
-            The keys are column names, and the values are sets of cell addresses
-            (for that column) that need refreshing.
+            The keys are column names, and the values are sets of dates whose
+            cells (in that column) need refreshing.
     """
 
     def __init__(self, prefix: Text, readonly: bool = False) -> None:
@@ -67,7 +87,7 @@ class Table(object):
         self.cm = ColumnManager(self.prefix, readonly=readonly)
         self.ds = DateSet(self.prefix, readonly=readonly)
 
-        self.need_refresh: DefaultDict[ColumnName, Set[CellAddr]] = defaultdict(
+        self.need_refresh: DefaultDict[ColumnName, Set[Date]] = defaultdict(
             set)
 
     def add_column(self, column: Column) -> None:
@@ -86,9 +106,8 @@ class Table(object):
 
         self.cm.add_column(column)
 
-        for date, row_keys in self.ds.dates_keys.items():
-            # Mark everything in this column for refresh for refresh
-            self.need_refresh[column.name].add(CellAddr(date, column.name))
+        # Mark everything in this column for refresh.
+        self.need_refresh[column.name].update(self.ds.dates_keys)
 
     def get_cell_value(self, cell_addr: CellAddr, key: CellKey,
                        assert_available_on: int = MAX_DATE,
@@ -136,35 +155,90 @@ class Table(object):
         """Updates the cell to the value in the passed cell, creating a new
         one if needed.
 
+        Same as calling set_cell_values with just the one key.
+
+        Arguments:
+            addr: Which address to store the key in.
+            key: The key for which to assign the value.
+            value: The value to assign.
+        """
+        self.set_cell_values(cell_addr, {key: value})
+
+    def set_cell_values(self, cell_addr: CellAddr,
+                        values: Dict[CellKey, Any]) -> None:
+        """Updates the cells at the address to the passed values, creating new
+        ones if needed.
+
         Passes the request along to this table's CellManager, while adding
-        the date / key to this table's DateSet.
+        the dates / keys to this table's DateSet.
 
         Marks dependents as needing refreshing.  If this function has been
         called during a refresh chain, the dependents have not yet been
-        processed, and will get updated in this loop.
+        processed, and will get updated in this loop.  Because all the keys
+        share a cell address, the page is looked up, and the dependents are
+        marked, only once.
+
+        If the cells already hold the values, then nothing is written and the
+        dependents are not marked.
 
         Arguments:
-            addr: Which address to store the key in.
-            key: The key for which to assign the value.
-            value: The value to assign.
+            cell_addr: Which address to store the keys in.
+            values: The values to assign, keyed by the key to assign them to.
         """
         if self.readonly:
             raise PermissionError("Cannot modify a readonly.")
 
-        # Throw an error if the column hasn't been loaded
+        # Throw an error if the column hasn't been loaded.
         if cell_addr.col not in self.cm:
             raise KeyError("Column not found.")
+        column = self.cm.get_column(cell_addr.col)
+
+        # Skip the keys where nothing would change.  A set cell always has its
+        # date / key in ds already.
+        changed = {key: value for key, value in values.items()
+                   if not _same_value(self.cells.get_value(cell_addr, key),
+                                      value)}
+        if not changed:
+            return
 
-        # Add an entry for the date / key in ds if it doesn't exists.
-        self.ds.push_date(cell_addr.date, key)
+        self.ds.push_dates([(cell_addr.date, key) for key in changed])
+        self.cells.set_values(cell_addr, changed)
+        self._mark_dependents(column, cell_addr)
 
-        # Write to the right place, potentially overwriting.
-        self.cells.set_value(cell_addr, key, value)
+    def set_cells(self,
+                  cells: Iterable[Tuple[CellAddr, CellKey, Any]]) -> None:
+        """Same as calling set_cell_value on each (cell_addr, key, value).
 
-        # Mark dependents as needing an update.
-        for dep in self.cm.get_column(cell_addr.col).cell_dependencies(
-                cell_addr):
-            self.need_refresh[dep.col].add(dep)
+        The cells are grouped by address first, and each address is written
+        with set_cell_values.  If a key is repeated at an address, the last
+        value wins.
+
+        Arguments:
+            cells: The (cell_addr, key, value) triples to write.
+        """
+        by_addr: Dict[CellAddr, Dict[CellKey, Any]] = dict()
+        for cell_addr, key, value in cells:
+            values = by_addr.get(cell_addr)
+            if values is None:
+                values = by_addr[cell_addr] = dict()
+            values[key] = value
+
+        for cell_addr, values in by_addr.items():
+            self.set_cell_values(cell_addr, values)
+
+    def _mark_dependents(self, column: Column, cell_addr: CellAddr) -> None:
+        """Marks the cell dependencies of the cell address as needing a
+        refresh.
+
+        Arguments:
+            column: The column of the cell address.
+            cell_addr: The address of the cell that was just written.
+        """
+        for dep_addr in column.cell_dependencies(cell_addr):
+            if dep_addr.col == cell_addr.col:
+                # Don't mark the cell that was just written.
+                continue
+            self.need_refresh[dep_addr.col].add(dep_addr.date)
 
     def all_keys_for_address(self, cell_addr: CellAddr) -> Set[CellKey]:
         """Get all the keys for a given address.
@@ -178,7 +252,82 @@ class Table(object):
         Returns:
             A set of cell keys at the given address.
         """
-        return self.ds.dates_keys[cell_addr.date]
+        return self.all_keys_for_date(cell_addr.date)
+
+    def all_keys_for_date(self, date: Date) -> Set[CellKey]:
+        """Get all the keys for a given date.
+
+        Pulls from the table's DateSet.
+
+        Arguments:
+            date: The date for which we want to pull all of the available keys.
+
+        Returns:
+            A set of cell keys on the given date.
+        """
+        return self.ds.dates_keys[date]
+
+    def get_column_slice(self, date: Date, col: ColumnName,
+                         assert_available_on: int = MAX_DATE,
+                         check_date_availability: bool =
+                         CHECK_DATE_AVAILABILITY) -> Dict[CellKey, Any]:
+        """Get the values of every key for a column on a single date.
+
+        This is the same as calling get_cell_value on each of the keys on the
+        date, except that the availability check is only done once for the
+        whole slice.
+
+        Arguments:
+            date: The date for which we want to pull values.
+            col: The name of the column for which we want to pull values.
+            assert_available_on: Date that we're pulling the cell values for.
+                Will fail if the cells aren't available on this date.
+            check_date_availability: If this is disabled, then don't make
+                assertion about availability date.
+
+        Returns:
+            A dict whose keys are the cell keys on the date, and whose values
+            are the values at those keys.
+        """
+        cell_addr = CellAddr(date, col)
+        if check_date_availability and assert_available_on < self.cm.get_column(
+                col).available_on_date(cell_addr):
+            raise KeyError("Not available on date.")
+
+        return {key: self.get_cell_value(cell_addr, key,
+                                         check_date_availability=False)
+                for key in self.all_keys_for_date(date)}
+
+    def get_column_arrays(self, date: Date, col: ColumnName,
+                          keys: Optional[np.ndarray] = None) -> \
+            Tuple[np.ndarray, np.ndarray]:
+        """Get all the keys and values for a column on a single date.
+
+        This is get_column_slice, laid out as arrays.  Pass the keys returned
+        from one call to later calls on the same date, so that arrays returned
+        for different columns line up row-by-row.
+
+        Arguments:
+            date: The date for which we want to pull values.
+            col: The name of the column for which we want to pull values.
+            keys: An object array of the keys to pull values for, from an
+                earlier call on the same date.  If unset, pulls every key on
+                the date.
+
+        Returns:
+            A pair of object arrays, the keys and the corresponding values.
+        """
+        column_slice = self.get_column_slice(date, col,
+                                             check_date_availability=False)
+        if keys is None:
+            keys = np.empty(len(column_slice), dtype=object)
+            for i, key in enumerate(column_slice):
+                keys[i] = key
+
+        values = np.empty(len(keys), dtype=object)
+        for i, key in enumerate(keys):
+            values[i] = column_slice[key]
+        return keys, values
 
     def refresh(self,
                 target_columns: Optional[List[ColumnName]] = None) -> None:
@@ -196,15 +345,20 @@ class Table(object):
         if self.readonly:
             return
 
+        # Columns may have gained dependencies since they were added.
+        self.cm.update_dependencies()
+
         # Determine all the intermediate columns in need of refreshing.
         if target_columns is None:
-            will_refresh = {col for col in self.cm._columns.keys()}
+            will_refresh = {col for col in self.cm.refresh_order}
         else:
             will_refresh = {col for col in target_columns}
             for col in self.cm.refresh_order[::-1]:
                 if col in will_refresh:
                     will_refresh.update(self.cm.reverse_dependency_graph[col])
 
+        # Check need_refresh as we go, since refreshing a column marks dates
+        # in the columns after it.
         for column_name in self.cm.refresh_order:
             if self.need_refresh[column_name] and column_name in will_refresh:
                 self.cm.get_column(column_name).refresh()
@@ -225,14 +379,23 @@ class Table(object):
         if dates is None:
             dates = self.ds.dates
 
-        rows = list()
-        for d in dates:
-            for k in self.all_keys_for_address(CellAddr(d, "")):
-                this_row = dict()
-                for c in columns:
-                    this_row[c] = self.get_cell_value(CellAddr(d, c), k)
-                rows.append(this_row)
-        return pd.DataFrame(rows, columns=columns)
+        rows = [(d, k) for d in dates for k in self.all_keys_for_date(d)]
+        if not rows:
+            return pd.DataFrame(columns=columns)
+
+        # Fill in a column at a time, visiting the rows in date order, so
+        # that each (month, column) page is read in one go.  The dates
+        # passed in may not be in order.
+        order = sorted(range(len(rows)), key=lambda i: rows[i][0])
+        get_cell_value = self.get_cell_value
+        data = dict()
+        for c in columns:
+            values = [None] * len(rows)
+            for i in order:
+                d, k = rows[i]
+                values[i] = get_cell_value(CellAddr(d, c), k)
+            data[c] = values
+        return pd.DataFrame(data, columns=columns)
 
     def open(self) -> None:
         """Open each of the core components."""
@@ -245,11 +408,9 @@ class Table(object):
         if self.readonly:
             return
 
-        # If anything need to be refreshed then refresh.
-        for _, v in self.need_refresh.items():
-            if v:
-                self.refresh()
-                break
+        # If any dates are waiting on a refresh, then refresh.
+        if any(self.need_refresh.values()):
+            self.refresh()
 
         self.cells.close()
         self.ds.close()
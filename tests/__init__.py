@@ -0,0 +1,37 @@
+"""Test package setup.
+
+Author: T.J. Gaffney (gaffneytj@google.com)
+
+Copyright 2019 Google LLC
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+The tests keep their data files in a temporary directory, never the real data
+directory.  This has to be set before cell_header is first imported.  The
+subdirectories that the library writes to are made here, the way they would
+be set up ahead of time for the real data directory.
+"""
+
+import atexit
+import os
+import shutil
+import tempfile
+
+_TEST_DATA_DIR = tempfile.mkdtemp(prefix="cell_link_test_")
+os.environ["CELL_LINK_DATA_DIR"] = _TEST_DATA_DIR
+atexit.register(shutil.rmtree, _TEST_DATA_DIR, ignore_errors=True)
+
+from cell_header import CELL_FILES_DIR, COLUMN_FILES_DIR, DATE_SET_DIR
+
+for _data_dir in [CELL_FILES_DIR, COLUMN_FILES_DIR, DATE_SET_DIR]:
+    os.mkdir(_data_dir)
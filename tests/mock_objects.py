@@ -17,6 +17,7 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import pickle
 from copy import deepcopy
 
 from table import *
@@ -26,13 +27,45 @@ MOCK_CM_DIR = "MOCK_CM_DIR"
 MOCK_DS_DIR = "MOCK_DS_DIR"
 MOCK_CELLS_DIR = "MOCK_CELLS_DIR"
 
+# Marks a missing fake file, since None could be stored.
+_MISSING = object()
+
+
+def _dumps(object: Any) -> Optional[bytes]:
+    """Pickle the object, or return None if it can't be pickled."""
+    try:
+        return pickle.dumps(object, protocol=pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return None
+
+
+def _clone(object: Any, data: Optional[bytes]) -> Any:
+    """A deep copy of the object, made from its pickle if there is one.
+
+    Unpickling is much faster than deepcopy, but objects holding lambdas
+    (like SimpleFormula columns) can't be pickled, so are deep copied.
+    """
+    if data is None:
+        return deepcopy(object)
+    return pickle.loads(data)
+
+
+def saved_copies(object: Any) -> Tuple[Any, Any]:
+    """Two separate deep copies of a saved object.
+
+    One is for the save log and one for the fake file, so that changes to one
+    don't show in the other.  The object is only pickled once.
+    """
+    data = _dumps(object)
+    return _clone(object, data), _clone(object, data)
+
 
 class MockColumnManager(ColumnManager):
     """A version of ColumnManager with mocked file operations.
 
     Attributes:
-        fake_files: A dictionary whose keys are file names, and whose values are
-            the files stored at those files.
+        fake_files: A dictionary whose keys are (mock directory, file name)
+            pairs, and whose values are the files stored at those files.
     """
 
     def __init__(self, prefix: Text, fake_files: Optional[Dict] = None):
@@ -45,29 +78,30 @@ class MockColumnManager(ColumnManager):
         super().__init__(prefix)
 
     def _walk_files(self):
-        for k, _ in self.fake_files.items():
-            if k.split("::")[0] == MOCK_CM_DIR:
-                yield ("", [k.split("::")[1]])
+        # Like os.walk, yield all the files in the directory at once.
+        files = [name for tag, name in self.fake_files if tag == MOCK_CM_DIR]
+        if files:
+            yield ("", files)
 
     def _load_file(self, path: Text) -> Any:
-        full_path = "{}::{}".format(MOCK_CM_DIR, path)
-        assert (full_path in self.fake_files)
+        result = self.fake_files.get((MOCK_CM_DIR, path), _MISSING)
+        assert (result is not _MISSING)
 
         self.load_log.append(path)
-        return self.fake_files[full_path]
+        return result
 
     def _save_file(self, object: Any, path: Text) -> None:
-        full_path = "{}::{}".format(MOCK_CM_DIR, path)
+        full_path = (MOCK_CM_DIR, path)
         self.save_log.append(path)
-        self.fake_files[full_path] = deepcopy(object)
+        self.fake_files[full_path] = _clone(object, _dumps(object))
 
 
 class MockDateSet(DateSet):
     """A version of DateSet with mocked file operations.
 
     Attributes:
-        fake_files: A dictionary whose keys are file names, and whose values are
-            the files stored at those files.
+        fake_files: A dictionary whose keys are (mock directory, file name)
+            pairs, and whose values are the files stored at those files.
     """
 
     def __init__(self, prefix: Text, fake_files: Optional[Dict] = None):
@@ -80,29 +114,43 @@ class MockDateSet(DateSet):
         super().__init__(prefix)
 
     def _walk_files(self):
-        for k, _ in self.fake_files.items():
-            if k.split("::")[0] == MOCK_DS_DIR:
-                yield ("", [k.split("::")[1]])
+        # Like os.walk, yield all the files in the directory at once.
+        files = [name for tag, name in self.fake_files if tag == MOCK_DS_DIR]
+        if files:
+            yield ("", files)
 
     def _load_file(self, path: Text) -> Any:
-        full_path = "{}::{}".format(MOCK_DS_DIR, path)
-        assert (full_path in self.fake_files)
+        result = self.fake_files.get((MOCK_DS_DIR, path), _MISSING)
+        assert (result is not _MISSING)
 
         self.load_log.append(path)
-        return self.fake_files[full_path]
+        return result
 
     def _save_file(self, object: Any, path: Text) -> None:
-        full_path = "{}::{}".format(MOCK_DS_DIR, path)
-        self.save_log.append((path, deepcopy(object)))
-        self.fake_files[full_path] = deepcopy(object)
+        full_path = (MOCK_DS_DIR, path)
+        logged, stored = saved_copies(object)
+        self.save_log.append((path, logged))
+        self.fake_files[full_path] = stored
+
+    def _append_file(self, records: List, path: Text) -> None:
+        full_path = (MOCK_DS_DIR, path)
+        self.save_log.append((path, _clone(records, _dumps(records))))
+        self.fake_files.setdefault(full_path, list()).extend(records)
+
+    def _load_journal(self, path: Text) -> List:
+        full_path = (MOCK_DS_DIR, path)
+        assert (full_path in self.fake_files)
+
+        self.load_log.append(path)
+        return list(self.fake_files[full_path])
 
 
 class MockCellMaster(CellMaster):
     """A version of CellMaster with mocked file operations.
 
     Attributes:
-        fake_files: A dictionary whose keys are file names, and whose values are
-            the files stored at those files.
+        fake_files: A dictionary whose keys are (mock directory, file name)
+            pairs, and whose values are the files stored at those files.
     """
     def __init__(self, prefix: Optional[Text],
                  cache_size: int = 5, fake_files: Optional[Dict] = None):
@@ -115,7 +163,7 @@ class MockCellMaster(CellMaster):
         super().__init__(prefix, cache_size)
 
     def _load_file(self, path: Text) -> Any:
-        full_path = "{}::{}".format(MOCK_CELLS_DIR, path)
+        full_path = (MOCK_CELLS_DIR, path)
 
         self.load_log.append(path)
         if full_path in self.fake_files:
@@ -123,17 +171,38 @@ class MockCellMaster(CellMaster):
         return dict()
 
     def _save_file(self, object: Any, path: Text) -> None:
-        full_path = "{}::{}".format(MOCK_CELLS_DIR, path)
+        full_path = (MOCK_CELLS_DIR, path)
 
-        self.save_log.append((path, deepcopy(object)))
-        self.fake_files[full_path] = deepcopy(object)
+        logged, stored = saved_copies(object)
+        self.save_log.append((path, logged))
+        self.fake_files[full_path] = stored
 
 
 class MockTable(Table):
-    def __init__(self, prefix: Text, fake_files: Optional[Dict] = None):
+    """A version of Table with mocked file operations.
+
+    Attributes:
+        fake_fs: A dictionary with a separate fake_files dictionary for each
+            of the core components, keyed by "cells", "cm", and "ds".  Pass
+            it to another MockTable to share the files.
+    """
+
+    def __init__(self, prefix: Text, fake_fs: Optional[Dict] = None):
         super().__init__(prefix)
 
-        # Mock out the core components
-        self.cells = MockCellMaster(self.prefix, fake_files=fake_files)
-        self.cm = MockColumnManager(self.prefix, fake_files=fake_files)
-        self.ds = MockDateSet(self.prefix, fake_files=fake_files)
+        self.fake_fs = dict()
+        if fake_fs is not None:
+            self.fake_fs = fake_fs
+
+        # Mock out the core components.  Each gets its own files, so it
+        # doesn't have to walk the others'.
+        self.cells = MockCellMaster(
+            self.prefix, fake_files=self.fake_fs.setdefault("cells", dict()))
+        self.cm = MockColumnManager(
+            self.prefix, fake_files=self.fake_fs.setdefault("cm", dict()))
+        self.ds = MockDateSet(
+            self.prefix, fake_files=self.fake_fs.setdefault("ds", dict()))
+
+        # Columns are opened against the table as they're first fetched, even
+        # if the table itself was never opened.
+        self.cm.table = self
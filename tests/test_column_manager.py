@@ -17,17 +17,27 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
 import unittest
+from unittest import mock
 
+from helpers import column_manager
 from tests.mock_objects import *
 
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
 
 class TestDateSet(unittest.TestCase):
 
     def setUp(self) -> None:
-        self.fake_fs = dict()
-        self.table = MockTable(TEST_PREFIX, self.fake_fs)
+        self.table = MockTable(TEST_PREFIX)
         self.table.open()
+        self.fake_fs = self.table.fake_fs
 
     def assertDictEqualMod(self, x, y):
         """Strip away primary_key and convert to regular dict."""
@@ -67,7 +77,7 @@ class TestDateSet(unittest.TestCase):
         self.table.close()
 
         self.assertListEqual(self.table.cm.save_log,
-                             ["data/column_data/test_prefix-A"])
+                             [os.path.join(COLUMN_FILES_DIR, "test_prefix-A")])
         self.assertSetEqual(self.table.cm.save_needed, set())
 
     def test_load_after_save(self):
@@ -78,6 +88,68 @@ class TestDateSet(unittest.TestCase):
         alt_table.open()
         self.assertEqual(alt_table.cm.get_column("A").name, self.col_a.name)
 
+    def test_lazy_load_after_save(self):
+        self.col_a = Column("A", self.table)
+        self.col_b = Column("B", self.table)
+        self.col_a._column_dependencies.add("B")
+        self.table.cm._update_column_dependencies()
+        self.table.close()
+
+        alt_table = MockTable(TEST_PREFIX, self.fake_fs)
+        alt_table.open()
+
+        # The refresh order is known before any column gets loaded.
+        self.assertDictEqual(alt_table.cm._columns, {})
+        self.assertIn("A", alt_table.cm)
+        self.assertListEqualMod(alt_table.cm.refresh_order, ["A", "B"])
+
+        self.assertEqual(alt_table.cm.get_column("A").name, "A")
+        self.assertListEqual(list(alt_table.cm._columns.keys()), ["A"])
+
+    def test_add_dependent_column(self):
+        self.col_a = Column("A", self.table)
+        self.col_b = Column("B", self.table)
+
+        # Like a derived column, mark the dependency before adding.
+        self.col_a._column_dependencies.add("C")
+        self.col_c = Column("C", self.table)
+
+        order = self.table.cm.refresh_order
+        self.assertLess(order.index("A"), order.index("C"))
+        self.assertSetEqual(self.table.cm.reverse_dependency_graph["C"], {"A"})
+
+    def test_update_dependencies_after_add(self):
+        self.col_a = Column("A", self.table)
+        self.col_b = Column("B", self.table)
+
+        # Change the dependencies after both columns were added.
+        self.table.cm.add_dependency("B", "A")
+        self.table.cm.update_dependencies()
+
+        order = self.table.cm.refresh_order
+        self.assertLess(order.index("B"), order.index("A"))
+        self.assertSetEqual(self.table.cm.reverse_dependency_graph["A"], {"B"})
+
+        # Nothing to do until another dependency is added.
+        self.assertFalse(self.table.cm._dependencies_stale)
+
+        # Removed edges are dropped too.
+        self.col_b._column_dependencies.discard("A")
+        self.table.cm._update_column_dependencies()
+        self.assertSetEqual(self.table.cm.reverse_dependency_graph["A"], set())
+
+    def test_deferred_add_column(self):
+        self.col_a = Column("A", self.table)
+        self.col_a._column_dependencies.add("B")
+        # Made on another table, so that it isn't added here yet.
+        col_b = Column("B", MockTable("other_prefix"))
+
+        self.table.cm.add_column(col_b, defer_refresh=True)
+        self.assertListEqualMod(self.table.cm.refresh_order, ["A"])
+
+        self.table.cm.update_dependencies()
+        self.assertListEqualMod(self.table.cm.refresh_order, ["A", "B"])
+
     def test_delay_update_logic(self):
         col_x = Column("X", self.table)
         col_y = Column("Y", self.table)
@@ -97,3 +169,84 @@ class TestDateSet(unittest.TestCase):
             {"X": {"Y"}, "Y": set(), "Z": {"X", "Y"}}
         )
         self.assertListEqualMod(self.table.cm.refresh_order, ["Z", "X", "Y"])
+
+    def test_reserved_column_name(self):
+        with self.assertRaises(ValueError):
+            Column(COLUMN_DEPENDENCIES_FILE, self.table)
+
+    def test_delete_dataset(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        cm = ColumnManager(TEST_PREFIX)
+        file_names = [cm._dependencies_file(), "{}-A".format(TEST_PREFIX),
+                      "{}-B".format(TEST_PREFIX), "other_prefix-A"]
+        for file_name in file_names:
+            open(os.path.join(directory, file_name), "w").close()
+
+        with mock.patch.object(column_manager, "COLUMN_FILES_DIR", directory):
+            column_manager.delete_dataset(TEST_PREFIX)
+
+        # The dependencies file goes with the columns.
+        self.assertListEqual(os.listdir(directory), ["other_prefix-A"])
+
+    def test_recover_from_backup(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        contents = {"foo-A": "old", "foo-A_{}".format(BACKUP): "new",
+                    "foobar-A": "old", "foobar-A_{}".format(BACKUP): "new"}
+        for file_name, content in contents.items():
+            with open(os.path.join(directory, file_name), "w") as f:
+                f.write(content)
+
+        with mock.patch.object(column_manager, "COLUMN_FILES_DIR", directory):
+            column_manager.recover_from_backup("foo")
+
+        # Only foo's files are restored, and no temporary files are left.
+        self.assertListEqual(sorted(os.listdir(directory)), sorted(contents))
+        for file_name, content in [("foo-A", "new"), ("foobar-A", "old")]:
+            with open(os.path.join(directory, file_name)) as f:
+                self.assertEqual(f.read(), content)
+
+    def test_reload_main_formula(self):
+        # A formula defined in a script's __main__ must be saved by value, so
+        # that a different script can still run it.
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for data_dir in [CELL_FILES_DIR, COLUMN_FILES_DIR, DATE_SET_DIR]:
+            os.mkdir(os.path.join(directory, os.path.basename(data_dir)))
+        env = dict(os.environ, CELL_LINK_DATA_DIR=directory,
+                   PYTHONPATH=REPO_DIR)
+
+        def run_script(script: Text) -> Text:
+            return subprocess.run(
+                [sys.executable, "-c", textwrap.dedent(script)], env=env,
+                cwd=directory, check=True, stdout=subprocess.PIPE,
+                universal_newlines=True).stdout
+
+        run_script("""
+            from derived_columns import *
+
+            def double(row):
+                return 2 * row["X"]
+
+            table = Table("main_formula")
+            table.open()
+            FlatColumn("X", table)
+            SimpleFormula("Y", table, double, ["X"])
+            table.set_cell_value(CellAddr(1, "X"), "key", 5)
+            table.refresh()
+            table.close()
+            """)
+        output = run_script("""
+            from derived_columns import *
+
+            table = Table("main_formula")
+            table.open()
+            table.set_cell_value(CellAddr(1, "X"), "key", 6)
+            table.refresh()
+            print(table.get_cell_value(CellAddr(1, "Y"), "key"))
+            table.close()
+            """)
+        self.assertEqual(output.strip(), "12")
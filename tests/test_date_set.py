@@ -40,6 +40,21 @@ class TestDateSet(unittest.TestCase):
                              {0: {key}, 1: {key}, 2: {key}, 3: {key}, 4: {key},
                               5: {key}})
 
+    def test_push_dates(self):
+        date_set = MockDateSet(TEST_PREFIX)
+        date_set.push_date(2, "abc")
+        date_set.push_dates([(5, "abc"), (1, "abc"), (2, "abc"), (2, "def"),
+                             (0, "abc"), (5, "abc")])
+
+        self.assertListEqual(date_set.dates, [0, 1, 2, 5])
+        self.assertDictEqual(date_set.dates_keys,
+                             {0: {"abc"}, 1: {"abc"}, 2: {"abc", "def"},
+                              5: {"abc"}})
+        # Repeats aren't journaled.
+        self.assertListEqual(date_set._journal,
+                             [(2, "abc"), (5, "abc"), (1, "abc"), (2, "def"),
+                              (0, "abc")])
+
     def test_ignore_repeats(self):
         key = "key"
 
@@ -73,6 +88,41 @@ class TestDateSet(unittest.TestCase):
                              {100: {key}, 200: {key}})
         other_date_set.close()
 
+    def test_journal(self):
+        fake_files = dict()
+
+        date_set = MockDateSet(TEST_PREFIX, fake_files=fake_files)
+        date_set.open()
+        date_set.push_date(100, "key")
+        date_set.close()
+
+        # Only the new date should be saved on the second close.
+        date_set = MockDateSet(TEST_PREFIX, fake_files=fake_files)
+        date_set.open()
+        date_set.push_date(100, "key")
+        date_set.push_date(50, "key")
+        date_set.close()
+        journal_path = "{}/{}_{}".format(DATE_SET_DIR, TEST_PREFIX,
+                                         DATES_JOURNAL_FILE)
+        backup_path = "{}_{}".format(journal_path, BACKUP)
+        self.assertListEqual(date_set.save_log,
+                             [(backup_path, [(50, "key")]),
+                              (journal_path, [(50, "key")])])
+
+        # The backups match each other, not just the primaries.
+        self.assertListEqual(fake_files[(MOCK_DS_DIR, backup_path)],
+                             [(50, "key")])
+        self.assertListEqual(
+            fake_files[(MOCK_DS_DIR, "{}/{}_{}_{}".format(
+                DATE_SET_DIR, TEST_PREFIX, DATES_FILE, BACKUP))], [100])
+
+        other_date_set = MockDateSet(TEST_PREFIX, fake_files=fake_files)
+        other_date_set.open()
+        self.assertListEqual(other_date_set.dates, [50, 100])
+        self.assertDictEqual(other_date_set.dates_keys,
+                             {50: {"key"}, 100: {"key"}})
+        other_date_set.close()
+
     def test_distinct_keys(self):
         key = "key"
 
@@ -102,3 +152,19 @@ class TestDateSet(unittest.TestCase):
 
         # Should include start and end dates.
         self.assertListEqual(date_set.slice(400, 1600), [400, 800, 1600])
+
+    def test_slice_array(self):
+        date_set = MockDateSet(TEST_PREFIX)
+        self.assertListEqual(date_set.slice_array().tolist(), [])
+
+        date_set.dates = [100, 200, 400, 800, 1600, 3200]
+        self.assertListEqual(date_set.slice_array().tolist(), date_set.dates)
+        self.assertListEqual(date_set.slice_array(500, 2000).tolist(),
+                             [800, 1600])
+        self.assertListEqual(date_set.slice_array(400, 1600).tolist(),
+                             [400, 800, 1600])
+
+        # New dates should show up.
+        date_set.push_date(1000, "key")
+        self.assertListEqual(date_set.slice_array(500, 2000).tolist(),
+                             [800, 1000, 1600])
@@ -18,6 +18,7 @@ limitations under the License.
 """
 
 from derived_columns import *
+from derived_columns import _calculate_f, _calculate_vectorized_f
 from tests.test_table import *
 
 
@@ -39,8 +40,9 @@ class MockSnapshotMaster(SnapshotMaster):
         return dict()
 
     def _save_file(self, object: Any, path: Text) -> None:
-        self.save_log.append((path, deepcopy(object)))
-        self.fake_files[path] = deepcopy(object)
+        logged, stored = saved_copies(object)
+        self.save_log.append((path, logged))
+        self.fake_files[path] = stored
 
     def open(self) -> None:
         """Don't touch any files."""
@@ -65,9 +67,9 @@ class MockWaterfall(Waterfall):
         """Round down to 100000, so that this won't affect most tests."""
         return date // 100000 * 100000
 
-    def open(self) -> None:
-        """Don't touch any files."""
-        pass
+    def open(self, table: Table, readonly: bool = False) -> None:
+        """Don't touch any files, and keep the mock snapshots."""
+        Column.open(self, table, readonly=readonly)
 
     def close(self) -> None:
         """Don't touch any files."""
@@ -115,8 +117,7 @@ class TestSimpleFormula(unittest.TestCase):
         self.table.need_refresh["dep_2"] = set()
 
         # Manually set need_refresh.  Don't update the middle date.
-        self.table.need_refresh["X_sq"] = {CellAddr(20010101, "X_sq"),
-                                           CellAddr(20010103, "X_sq")}
+        self.table.need_refresh["X_sq"] = {20010101, 20010103}
 
         x_sq.refresh()
         # This is usually done by the table's refresh function, but I want to
@@ -138,14 +139,54 @@ class TestSimpleFormula(unittest.TestCase):
             1600)
 
         self.maxDiff = None
-        # The dependencies should be marked for update now.
+        # The dependencies should be marked for update now.  Reading the
+        # never-updated cell on the middle date initialized it, which marks
+        # that date too.
         self.assertDictEqual(self.table.need_refresh, {
             "X_sq": set(), "X": set(), "Y": set(),
-            "dep_1": {CellAddr(20010101, "dep_1"),
-                      CellAddr(20010103, "dep_1")},
-            "dep_2": {CellAddr(20010101, "dep_2"),
-                      CellAddr(20010103, "dep_2")}})
+            "dep_1": {20010101, 20010102, 20010103},
+            "dep_2": {20010101, 20010102, 20010103}})
+
+    def test_vectorized_refresh(self):
+        self.table.set_cell_value(CellAddr(20010101, "X"), "key_1", 10)
+        self.table.set_cell_value(CellAddr(20010101, "X"), "key_2", None)
+        self.table.set_cell_value(CellAddr(20010101, "X"), "key_3", 30)
 
+        x_sq = SimpleFormula(name="X_sq", table=self.table, f=self.sq,
+                             required_columns=["X"],
+                             vectorized_f=lambda cols: cols["X"] ** 2)
+        self.table.need_refresh["X_sq"] = {20010101}
+        x_sq.refresh()
+
+        self.assertEqual(
+            self.table.get_cell_value(CellAddr(20010101, "X_sq"), "key_1"),
+            100)
+        self.assertIsNone(
+            self.table.get_cell_value(CellAddr(20010101, "X_sq"), "key_2"))
+        self.assertEqual(
+            self.table.get_cell_value(CellAddr(20010101, "X_sq"), "key_3"),
+            900)
+        self.assertIs(type(self.table.get_cell_value(
+            CellAddr(20010101, "X_sq"), "key_3")), int)
+
+
+    def test_vectorized_missing_matches_f(self):
+        # Every kind of missing value that f skips, vectorized_f skips too.
+        column_slices = {"X": {"key_1": 2, "key_2": NoneClass(),
+                               "key_3": float("nan"), "key_4": None}}
+        keys = ["key_1", "key_2", "key_3", "key_4"]
+        self.assertListEqual(
+            _calculate_vectorized_f(lambda cols: cols["X"] ** 2,
+                                    column_slices, keys),
+            [_calculate_f(self.sq, column_slices, key) for key in keys])
+
+    def test_vectorized_mixed_column(self):
+        # A string in the column doesn't turn the other values into strings.
+        column_slices = {"X": {"key_1": 1, "key_2": "a"}}
+        self.assertListEqual(
+            _calculate_vectorized_f(lambda cols: cols["X"] * 2,
+                                    column_slices, ["key_1", "key_2"]),
+            [2, "aa"])
 
 class TestWaterfall(unittest.TestCase):
 
@@ -199,46 +240,111 @@ class TestWaterfall(unittest.TestCase):
             table.get_cell_value(CellAddr(2, "balance"), "row_3"),
             25)  # Other
 
-    def test_one_map_multiple_dates(self) -> None:
+    def test_numpy_values_stored_as_python(self) -> None:
+        table = MockTable(TEST_PREFIX)
+        account_col = FlatColumn("account", table)
+        amount_col = FlatColumn("amount", table)
+
+        table.set_cell_value(CellAddr(1, "account"), "row_1", "Checking")
+        table.set_cell_value(CellAddr(1, "amount"), "row_1", np.int64(100))
+        table.set_cell_value(CellAddr(1, "account"), "row_2", "Checking")
+        table.set_cell_value(CellAddr(1, "amount"), "row_2", np.int64(-70))
+        table.set_cell_value(CellAddr(2, "account"), "row_1", "Checking")
+
+        waterfall_col = MockWaterfall(name="balance", table=table,
+                                      required_columns=["account", "amount"],
+                                      maps=[WaterfallMap("account", "amount")],
+                                      output_key="account")
+        table.refresh()
+
+        increment = waterfall_col._get_snapshot_increment(1)
+        self.assertIs(type(increment["Checking"]), int)
+        balance = table.get_cell_value(CellAddr(2, "balance"), "row_1")
+        self.assertEqual(balance, 30)
+        self.assertIs(type(balance), int)
+
+    def test_increment_skips_unkeyed_rows(self) -> None:
         table = MockTable(TEST_PREFIX)
         account_col = FlatColumn("account", table)
         amount_col = FlatColumn("amount", table)
 
         table.set_cell_value(CellAddr(1, "account"), "row_1", "Checking")
         table.set_cell_value(CellAddr(1, "amount"), "row_1", 100)
-        table.set_cell_value(CellAddr(1, "account"), "row_2", "Savings")
-        table.set_cell_value(CellAddr(1, "amount"), "row_2", 5)
-        table.set_cell_value(CellAddr(1, "account"), "row_3", "Checking")
-        table.set_cell_value(CellAddr(1, "amount"), "row_3", -70)
-        table.set_cell_value(CellAddr(1, "account"), "row_4", "Other")
-        table.set_cell_value(CellAddr(1, "amount"), "row_4", 25)
-        table.set_cell_value(CellAddr(1, "account"), "row_5", "Savings")
-        table.set_cell_value(CellAddr(1, "amount"), "row_5", 5)
+        table.set_cell_value(CellAddr(1, "account"), "row_2", None)
+
+        waterfall_col = MockWaterfall(name="balance", table=table,
+                                      required_columns=["account", "amount"],
+                                      maps=[WaterfallMap("account", "amount")],
+                                      output_key="account")
+
+        self.assertDictEqual(waterfall_col._get_snapshot_increment(1),
+                             {"Checking": 100})
+        # The amount on the row without an account was never read, so never
+        # initialized.
+        self.assertIsInstance(
+            table.cells.get_value(CellAddr(1, "amount"), "row_2"), NoneClass)
+
+    def test_increment_keeps_value_types(self) -> None:
+        table = MockTable(TEST_PREFIX)
+        account_col = FlatColumn("account", table)
+        amount_col = FlatColumn("amount", table)
+
+        # Each account sums in its own type, however many rows there are.
+        num_rows = 100
+        table.set_cell_values(
+            CellAddr(1, "account"),
+            {"row_{}".format(i): ["Checking", "Savings"][i % 2]
+             for i in range(num_rows)})
+        table.set_cell_values(
+            CellAddr(1, "amount"),
+            {"row_{}".format(i): [np.int64(1), 0.5][i % 2]
+             for i in range(num_rows)})
+
+        waterfall_col = MockWaterfall(name="balance", table=table,
+                                      required_columns=["account", "amount"],
+                                      maps=[WaterfallMap("account", "amount")],
+                                      output_key="account")
+
+        increment = waterfall_col._get_snapshot_increment(1)
+        self.assertDictEqual(increment, {"Checking": 50, "Savings": 25.0})
+        self.assertIs(type(increment["Checking"]), int)
+        self.assertIs(type(increment["Savings"]), float)
+
+    def test_one_map_multiple_dates(self) -> None:
+        table = MockTable(TEST_PREFIX)
+        account_col = FlatColumn("account", table)
+        amount_col = FlatColumn("amount", table)
+
+        table.set_cell_values(CellAddr(1, "account"),
+                              {"row_1": "Checking", "row_2": "Savings",
+                               "row_3": "Checking", "row_4": "Other",
+                               "row_5": "Savings"})
+        table.set_cell_values(CellAddr(1, "amount"),
+                              {"row_1": 100, "row_2": 5, "row_3": -70,
+                               "row_4": 25, "row_5": 5})
 
         # Each type shows up once.
-        table.set_cell_value(CellAddr(2, "account"), "row_1", "Checking")
-        table.set_cell_value(CellAddr(2, "amount"), "row_1", 10000)
-        table.set_cell_value(CellAddr(2, "account"), "row_2", "Savings")
-        table.set_cell_value(CellAddr(2, "amount"), "row_2", 20000)
-        table.set_cell_value(CellAddr(2, "account"), "row_3", "Other")
-        table.set_cell_value(CellAddr(2, "amount"), "row_3", 30000)
+        table.set_cell_values(CellAddr(2, "account"),
+                              {"row_1": "Checking", "row_2": "Savings",
+                               "row_3": "Other"})
+        table.set_cell_values(CellAddr(2, "amount"),
+                              {"row_1": 10000, "row_2": 20000,
+                               "row_3": 30000})
 
         # Checking shows up three times.
-        table.set_cell_value(CellAddr(3, "account"), "row_1", "Checking")
-        table.set_cell_value(CellAddr(3, "amount"), "row_1", 1)
-        table.set_cell_value(CellAddr(3, "account"), "row_2", "Checking")
-        table.set_cell_value(CellAddr(3, "amount"), "row_2", 2)
-        table.set_cell_value(CellAddr(3, "account"), "row_3", "Checking")
-        table.set_cell_value(CellAddr(3, "amount"), "row_3", 3)
+        table.set_cell_values(CellAddr(3, "account"),
+                              {"row_1": "Checking", "row_2": "Checking",
+                               "row_3": "Checking"})
+        table.set_cell_values(CellAddr(3, "amount"),
+                              {"row_1": 1, "row_2": 2, "row_3": 3})
 
         # New account type should also be fine.
-        table.set_cell_value(CellAddr(4, "account"), "row_1", "New Acct")
-        table.set_cell_value(CellAddr(4, "amount"), "row_1", 12345)
+        table.set_cell_values(CellAddr(4, "account"), {"row_1": "New Acct"})
+        table.set_cell_values(CellAddr(4, "amount"), {"row_1": 12345})
 
-        table.set_cell_value(CellAddr(5, "account"), "row_1", "Checking")
-        table.set_cell_value(CellAddr(5, "account"), "row_2", "Savings")
-        table.set_cell_value(CellAddr(5, "account"), "row_3", "Other")
-        table.set_cell_value(CellAddr(5, "account"), "row_4", "New Acct")
+        table.set_cell_values(CellAddr(5, "account"),
+                              {"row_1": "Checking", "row_2": "Savings",
+                               "row_3": "Other", "row_4": "New Acct"})
 
         waterfall_col = MockWaterfall(name="balance", table=table,
                                       required_columns=["account", "amount"],
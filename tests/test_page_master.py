@@ -17,6 +17,7 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import os
 import unittest
 
 from tests.mock_objects import *
@@ -39,19 +40,42 @@ class TestCellManager(unittest.TestCase):
 
     def test_basic_setup(self):
         self.assertEqual(self.mcm.cache_size, 3)
-        self.assertEqual(self.mcm.cache, [])
-
-    def test_cell_key(self):
-        self.assertEqual(self.mcm._addr_key(self.cell_addr_1, "key"),
-                         "CellAddr(date=20110101, col='test_col'): key")
-        self.assertEqual(self.mcm._addr_key(self.cell_addr_2, "alt key"),
-                         "CellAddr(date=20110202, col='test_col'): alt key")
+        self.assertDictEqual(self.mcm.cache, {})
+
+    def test_page_layout(self):
+        self.mcm.set_value(self.cell_addr_2, "key", "A")
+        self.mcm.set_value(self.cell_addr_2, "alt key", "B")
+        self.mcm.set_value(self.cell_addr_2b, "key", "C")
+
+        # Pages hold a dict of keys for each address.
+        self.assertDictEqual(self.mcm.cache[(201102, TEST_COL)], {
+            self.cell_addr_2: {"key": "A", "alt key": "B"},
+            self.cell_addr_2b: {"key": "C"}})
+
+    def test_upgrade_old_page(self):
+        page = {"CellAddr(date=20110101, col='test_col'): key": "A",
+                "CellAddr(date=20110101, col='test_col'): alt key": "B"}
+        self.assertTrue(self.mcm._upgrade_page(page))
+        self.assertDictEqual(page,
+                             {self.cell_addr_1: {"key": "A", "alt key": "B"}})
+
+        # Already upgraded.
+        self.assertFalse(self.mcm._upgrade_page(page))
+
+    def test_base_page_not_upgraded(self):
+        # The base class can't tell old pages from string addresses.
+        page_master = PageMaster(TEST_PREFIX)
+        page = {"addr": {"key": "A"}}
+        self.assertFalse(page_master._upgrade_page(page))
+        self.assertDictEqual(page, {"addr": {"key": "A"}})
 
     def test_addr_to_page(self):
         self.assertEqual(self.mcm._addr_to_page(self.cell_addr_1),
-                         "201101-test_col")
+                         (201101, TEST_COL))
         self.assertEqual(self.mcm._addr_to_page(self.cell_addr_2),
-                         "201102-test_col")
+                         (201102, TEST_COL))
+        self.assertEqual(self.mcm._page_file_name((201101, TEST_COL)),
+                         "201101-test_col")
 
     def test_default_value_is_none(self):
         self.assertIsNone(self.mcm.get_value(self.cell_addr_1, KEY))
@@ -65,7 +89,7 @@ class TestCellManager(unittest.TestCase):
 
         # But only one page load.
         self.assertListEqual(self.mcm.load_log, [
-            'data/cell_files/test_prefix_201102-test_col'
+            os.path.join(CELL_FILES_DIR, "test_prefix_201102-test_col")
         ])
 
     def test_distinct_keys_on_single_address(self):
@@ -92,12 +116,24 @@ class TestCellManager(unittest.TestCase):
         self.assertEqual(self.mcm.get_value(self.cell_addr_1, KEY), "D")
 
         self.assertListEqual(self.mcm.load_log, [
-            'data/cell_files/test_prefix_201101-test_col',
-            'data/cell_files/test_prefix_201102-test_col',
-            'data/cell_files/test_prefix_201103-test_col'
+            os.path.join(CELL_FILES_DIR, "test_prefix_201101-test_col"),
+            os.path.join(CELL_FILES_DIR, "test_prefix_201102-test_col"),
+            os.path.join(CELL_FILES_DIR, "test_prefix_201103-test_col")
         ])
         self.assertListEqual(self.mcm.save_log, [])
 
+    def test_unchanged_pages_not_saved(self):
+        self.mcm.set_value(self.cell_addr_1, KEY, "A")
+        self.mcm.save_all_and_empty()
+        self.assertEqual(len(self.mcm.save_log), 1)
+
+        # Only reading, even as pages fall out of the cache.
+        for cell_addr in [self.cell_addr_1, self.cell_addr_2, self.cell_addr_3,
+                          self.cell_addr_4]:
+            self.mcm.get_value(cell_addr, KEY)
+        self.mcm.close()
+        self.assertEqual(len(self.mcm.save_log), 1)
+
     def test_save_and_open(self):
         # Write and overwrite while cycling through cache.
         self.mcm.set_value(self.cell_addr_1, KEY, "A")
@@ -109,31 +145,32 @@ class TestCellManager(unittest.TestCase):
         self.mcm.set_value(self.cell_addr_3, KEY, "G")  # 4 falls out
 
         self.assertListEqual(self.mcm.load_log, [
-            'data/cell_files/test_prefix_201101-test_col',
-            'data/cell_files/test_prefix_201102-test_col',
-            'data/cell_files/test_prefix_201103-test_col',
-            'data/cell_files/test_prefix_201104-test_col',
-            'data/cell_files/test_prefix_201101-test_col',
-            'data/cell_files/test_prefix_201102-test_col',
-            'data/cell_files/test_prefix_201103-test_col'
+            os.path.join(CELL_FILES_DIR, "test_prefix_201101-test_col"),
+            os.path.join(CELL_FILES_DIR, "test_prefix_201102-test_col"),
+            os.path.join(CELL_FILES_DIR, "test_prefix_201103-test_col"),
+            os.path.join(CELL_FILES_DIR, "test_prefix_201104-test_col"),
+            os.path.join(CELL_FILES_DIR, "test_prefix_201101-test_col"),
+            os.path.join(CELL_FILES_DIR, "test_prefix_201102-test_col"),
+            os.path.join(CELL_FILES_DIR, "test_prefix_201103-test_col")
         ])
         self.assertListEqual(self.mcm.save_log, [
-            ('data/cell_files/test_prefix_201101-test_col',
-             {"CellAddr(date=20110101, col='test_col'): test_key": "A"}),
-            ('data/cell_files/test_prefix_201102-test_col',
-             {"CellAddr(date=20110202, col='test_col'): test_key": "B"}),
-            ('data/cell_files/test_prefix_201103-test_col',
-             {"CellAddr(date=20110303, col='test_col'): test_key": "C"}),
-            ('data/cell_files/test_prefix_201104-test_col',
-             {"CellAddr(date=20110404, col='test_col'): test_key": "D"})
+            (os.path.join(CELL_FILES_DIR, "test_prefix_201101-test_col"),
+             {CellAddr(20110101, TEST_COL): {KEY: "A"}}),
+            (os.path.join(CELL_FILES_DIR, "test_prefix_201102-test_col"),
+             {CellAddr(20110202, TEST_COL): {KEY: "B"}}),
+            (os.path.join(CELL_FILES_DIR, "test_prefix_201103-test_col"),
+             {CellAddr(20110303, TEST_COL): {KEY: "C"}}),
+            (os.path.join(CELL_FILES_DIR, "test_prefix_201104-test_col"),
+             {CellAddr(20110404, TEST_COL): {KEY: "D"}})
         ])
 
         # Even reading should trigger an update
         self.assertEqual(self.mcm.get_value(self.cell_addr_4, KEY), "D")
 
-        self.assertEqual(self.mcm.load_log[-1],
-                         'data/cell_files/test_prefix_201104-test_col')
+        self.assertEqual(
+            self.mcm.load_log[-1],
+            os.path.join(CELL_FILES_DIR, "test_prefix_201104-test_col"))
         self.assertEqual(
             self.mcm.save_log[-1],
-            ('data/cell_files/test_prefix_201101-test_col',
-             {"CellAddr(date=20110101, col='test_col'): test_key": "E"}))
+            (os.path.join(CELL_FILES_DIR, "test_prefix_201101-test_col"),
+             {CellAddr(20110101, TEST_COL): {KEY: "E"}}))
@@ -33,7 +33,8 @@ class RecordRefreshColumn(FlatColumn):
         self.refresh_calls = list()
 
     def refresh(self) -> None:
-        self.refresh_calls.append(self.table.need_refresh[self.name])
+        # Copy, so that later changes to need_refresh don't show here.
+        self.refresh_calls.append(set(self.table.need_refresh[self.name]))
 
 
 class TestTable(unittest.TestCase):
@@ -47,9 +48,21 @@ class TestTable(unittest.TestCase):
         self.table.add_column(self.col_a)
         self.table.add_column(self.col_b)
 
+    def _fill_three_columns(self):
+        """Adds a third column C, then sets one key in each of A, B, and C on
+        dates 1, 2, and 3: A holds 100-300, B 400-600, and C 700-900."""
+        col_c = FlatColumn("C", self.table)
+        self.table.add_column(col_c)
+
+        for i, col in enumerate(["A", "B", "C"]):
+            for date in [1, 2, 3]:
+                self.table.set_cell_value(CellAddr(date, col), "key",
+                                          300 * i + 100 * date)
+
     def test_basic_setup(self):
         self.assertDictEqual(self.table.need_refresh, {"A": set(), "B": set()})
-        self.assertCountEqual(self.table.cm.refresh_order, ["A", "B"])
+        # A feeds B, so A must refresh first.
+        self.assertListEqual(self.table.cm.refresh_order, ["A", "B"])
 
     def test_add_column_marks_refresh(self):
         # Make new cell addresses; no dependencies
@@ -62,7 +75,7 @@ class TestTable(unittest.TestCase):
         self.assertDictEqual(self.table.need_refresh, {
             "A": set(),
             "B": set(),
-            "C": {CellAddr(1, "C"), CellAddr(2, "C")}
+            "C": {1, 2}
         })
 
     def test_set_cell_value_mark_refresh(self):
@@ -71,9 +84,39 @@ class TestTable(unittest.TestCase):
 
         self.assertDictEqual(self.table.need_refresh, {
             "A": set(),
-            "B": {CellAddr(1, "B"), CellAddr(2, "B")}
+            "B": {1, 2}
         })
 
+    def test_set_cell_value_unchanged_skips_refresh(self):
+        self.table.set_cell_value(CellAddr(1, "A"), "key", 100)
+        self.table.need_refresh["B"] = set()
+
+        # Setting the same value again shouldn't mark dependents.
+        self.table.set_cell_value(CellAddr(1, "A"), "key", 100)
+        self.assertSetEqual(self.table.need_refresh["B"], set())
+
+        # Nor should the same number as a numpy scalar.
+        self.table.set_cell_value(CellAddr(1, "A"), "key", np.int64(100))
+        self.assertSetEqual(self.table.need_refresh["B"], set())
+
+        # But a value of a different type should.
+        self.table.set_cell_value(CellAddr(1, "A"), "key", 100.0)
+        self.assertSetEqual(self.table.need_refresh["B"], {1})
+
+    def test_key_init_marks_refresh(self):
+        self.table.set_cell_value(CellAddr(1, "B"), "key", 100)
+        self.table.need_refresh["B"] = set()
+
+        # Reading a missing cell writes its initial value, which marks the
+        # dependents, even on a date / key that ds already has.
+        self.assertIsNone(self.table.get_cell_value(CellAddr(1, "A"), "key"))
+        self.assertSetEqual(self.table.need_refresh["B"], {1})
+
+        # A new date / key is marked too.
+        self.assertIsNone(self.table.get_cell_value(CellAddr(2, "A"), "key"))
+        self.assertListEqual(self.table.ds.dates, [1, 2])
+        self.assertSetEqual(self.table.need_refresh["B"], {1, 2})
+
     def test_set_cell_value_should_update_components(self):
         self.table.set_cell_value(CellAddr(1, "A"), "key", 100)
         self.table.set_cell_value(CellAddr(2, "A"), "key", 100)
@@ -84,6 +127,39 @@ class TestTable(unittest.TestCase):
         self.assertEqual(self.table.get_cell_value(CellAddr(1, "A"), "key"),
                          100)
 
+    def test_set_cell_values(self):
+        self.table.set_cell_value(CellAddr(1, "A"), "key1", 100)
+        self.table.need_refresh["B"] = set()
+
+        # Unchanged values alone shouldn't mark dependents.
+        self.table.set_cell_values(CellAddr(1, "A"), {"key1": 100})
+        self.assertSetEqual(self.table.need_refresh["B"], set())
+
+        self.table.set_cell_values(CellAddr(1, "A"),
+                                   {"key1": 100, "key2": 200})
+        self.assertSetEqual(self.table.need_refresh["B"], {1})
+        self.assertDictEqual(self.table.ds.dates_keys, {1: {"key1", "key2"}})
+        self.assertEqual(self.table.get_cell_value(CellAddr(1, "A"), "key2"),
+                         200)
+
+    def test_set_cells(self):
+        cells = [(CellAddr(2, "A"), "key_1", 100),
+                 (CellAddr(1, "A"), "key_1", 200),
+                 (CellAddr(2, "A"), "key_2", 300),
+                 (CellAddr(1, "B"), "key_1", 400)]
+        self.table.set_cells(cells)
+
+        # Same as writing the cells one at a time.
+        self.assertDictEqual(self.table.need_refresh, {
+            "A": set(),
+            "B": {1, 2}
+        })
+        self.assertListEqual(self.table.ds.dates, [1, 2])
+        self.assertDictEqual(self.table.ds.dates_keys,
+                             {1: {"key_1"}, 2: {"key_1", "key_2"}})
+        for cell_addr, key, value in cells:
+            self.assertEqual(self.table.get_cell_value(cell_addr, key), value)
+
     def test_set_cell_value_on_non_column_fails(self):
         with self.assertRaises(KeyError):
             self.table.set_cell_value(CellAddr(1, "C"), "key", 100)
@@ -91,25 +167,46 @@ class TestTable(unittest.TestCase):
     def test_get_cell_value_should_fail_if_not_available(self):
         self.table.set_cell_value(CellAddr(500, "A"), "key", 100)
 
-        # This should work
-        self.assertEqual(self.table.get_cell_value(CellAddr(500, "A"), "key",
-                                                   check_date_availability=True),
-                         100)
-        # And these.
-        self.assertEqual(
-            self.table.get_cell_value(CellAddr(500, "A"), "key",
-                                      assert_available_on=500,
-                                      check_date_availability=True), 100)
-        self.assertEqual(
-            self.table.get_cell_value(CellAddr(500, "A"), "key",
-                                      assert_available_on=501,
-                                      check_date_availability=True), 100)
+        # These should all work.
+        for assert_available_on in [MAX_DATE, 500, 501]:
+            with self.subTest(assert_available_on=assert_available_on):
+                self.assertEqual(
+                    self.table.get_cell_value(
+                        CellAddr(500, "A"), "key",
+                        assert_available_on=assert_available_on,
+                        check_date_availability=True), 100)
         # But this fails
         with self.assertRaises(KeyError):
             self.table.get_cell_value(CellAddr(500, "A"), "key",
                                       assert_available_on=499,
                                       check_date_availability=True)
 
+    def test_get_column_slice(self):
+        self.table.set_cell_value(CellAddr(1, "A"), "key_1", 100)
+        self.table.set_cell_value(CellAddr(1, "A"), "key_2", 200)
+        self.table.set_cell_value(CellAddr(2, "A"), "key_1", 300)
+
+        self.assertDictEqual(self.table.get_column_slice(1, "A"),
+                             {"key_1": 100, "key_2": 200})
+        self.assertDictEqual(self.table.get_column_slice(2, "A"),
+                             {"key_1": 300})
+
+    def test_get_column_arrays(self):
+        self.table.set_cell_value(CellAddr(1, "A"), "key_1", 100)
+        self.table.set_cell_value(CellAddr(1, "A"), "key_2", 200)
+        self.table.set_cell_value(CellAddr(1, "B"), "key_2", 400)
+
+        keys, a_values = self.table.get_column_arrays(1, "A")
+        self.assertSetEqual(set(keys), {"key_1", "key_2"})
+        self.assertDictEqual(dict(zip(keys, a_values)),
+                             {"key_1": 100, "key_2": 200})
+
+        # Reusing the keys lines the rows up across columns.
+        same_keys, b_values = self.table.get_column_arrays(1, "B", keys)
+        self.assertIs(same_keys, keys)
+        self.assertDictEqual(dict(zip(keys, b_values)),
+                             {"key_1": None, "key_2": 400})
+
     def test_refresh_refreshes(self):
         self.table.set_cell_value(CellAddr(1, "A"), "key", 100)
         self.table.set_cell_value(CellAddr(2, "A"), "key", 100)
@@ -117,7 +214,7 @@ class TestTable(unittest.TestCase):
         # B needs a refresh
         self.assertDictEqual(self.table.need_refresh, {
             "A": set(),
-            "B": {CellAddr(1, "B"), CellAddr(2, "B")}
+            "B": {1, 2}
         })
 
         # So refresh
@@ -126,23 +223,39 @@ class TestTable(unittest.TestCase):
         # Column B should have gotten update calls.
         self.assertDictEqual(self.table.need_refresh, {"A": set(), "B": set()})
         self.assertListEqual(self.col_a.refresh_calls, [])
-        self.assertListEqual(self.col_b.refresh_calls,
-                             [{CellAddr(1, "B"), CellAddr(2, "B")}])
+        self.assertListEqual(self.col_b.refresh_calls, [{1, 2}])
 
-    def test_make_df(self):
-        # Add a third column first.
-        col_c = FlatColumn("C", self.table)
+    def test_refresh_pending_dates(self):
+        # Clear out the refresh from adding the columns.
+        self.table.refresh()
+
+        # Dates queued directly in need_refresh should still get refreshed.
+        self.table.need_refresh["B"] = {1}
+        self.table.refresh()
+        self.assertListEqual(self.col_b.refresh_calls, [{1}])
+
+        # Including on close.
+        self.table.need_refresh["B"] = {2}
+        self.table.close()
+        self.assertListEqual(self.col_b.refresh_calls, [{1}, {2}])
+
+    def test_refresh_target_after_dependency_change(self):
+        col_c = RecordRefreshColumn("C", self.table)
         self.table.add_column(col_c)
+        self.table.refresh()
 
-        self.table.set_cell_value(CellAddr(1, "A"), "key", 100)
-        self.table.set_cell_value(CellAddr(2, "A"), "key", 200)
-        self.table.set_cell_value(CellAddr(3, "A"), "key", 300)
-        self.table.set_cell_value(CellAddr(1, "B"), "key", 400)
-        self.table.set_cell_value(CellAddr(2, "B"), "key", 500)
-        self.table.set_cell_value(CellAddr(3, "B"), "key", 600)
-        self.table.set_cell_value(CellAddr(1, "C"), "key", 700)
-        self.table.set_cell_value(CellAddr(2, "C"), "key", 800)
-        self.table.set_cell_value(CellAddr(3, "C"), "key", 900)
+        # Make C depend on B only after it was added.
+        self.table.cm.add_dependency("B", "C")
+        self.table.need_refresh["B"] = {1}
+        self.table.need_refresh["C"] = {1}
+        self.table.refresh(target_columns=["C"])
+
+        # B feeds C now, so it must be refreshed too.
+        self.assertListEqual(self.col_b.refresh_calls, [{1}])
+        self.assertListEqual(col_c.refresh_calls, [{1}])
+
+    def test_make_df(self):
+        self._fill_three_columns()
 
         expected_df = pd.DataFrame({
             "A": [100, 200, 300],
@@ -154,19 +267,7 @@ class TestTable(unittest.TestCase):
                            expected_df)
 
     def test_make_partial_df(self):
-        # Add a third column first.
-        col_c = FlatColumn("C", self.table)
-        self.table.add_column(col_c)
-
-        self.table.set_cell_value(CellAddr(1, "A"), "key", 100)
-        self.table.set_cell_value(CellAddr(2, "A"), "key", 200)
-        self.table.set_cell_value(CellAddr(3, "A"), "key", 300)
-        self.table.set_cell_value(CellAddr(1, "B"), "key", 400)
-        self.table.set_cell_value(CellAddr(2, "B"), "key", 500)
-        self.table.set_cell_value(CellAddr(3, "B"), "key", 600)
-        self.table.set_cell_value(CellAddr(1, "C"), "key", 700)
-        self.table.set_cell_value(CellAddr(2, "C"), "key", 800)
-        self.table.set_cell_value(CellAddr(3, "C"), "key", 900)
+        self._fill_three_columns()
 
         expected_df = pd.DataFrame({
             "A": [100, 300],
@@ -30,20 +30,15 @@ class TestTopologicalSort(unittest.TestCase):
 
     def assert_partial_order(self, graph: Dict, result: List):
         """Asserts that each node/child appear in that order in result."""
-
-        def is_order(x_label, y_label):
-            """Returns true only if x_label comes before y_label."""
-            for node in result:
-                if node == y_label:
-                    return False
-                if node == x_label:
-                    return True
-            # Neither label found.  Should never happen.
-            raise
+        # Look up each node's position once, rather than scanning result for
+        # every edge.
+        position = {node: i for i, node in enumerate(result)}
 
         for node, deps in graph.items():
             for dep in deps:
-                self.assertTrue(is_order(node, dep))
+                self.assertIn(node, position)
+                self.assertIn(dep, position)
+                self.assertLess(position[node], position[dep])
 
     def test_cycle_detections(self):
         graph = {
@@ -52,7 +47,8 @@ class TestTopologicalSort(unittest.TestCase):
             "c": {"a"},
         }
 
-        self.assertRaises(ValueError, lambda: topological(graph))
+        with self.assertRaises(ValueError):
+            topological(graph)
 
     def test_socks(self):
         # This is the example given in CLRS.
@@ -75,3 +71,9 @@ class TestTopologicalSort(unittest.TestCase):
                              "undershorts", "pants", "shoes", "socks"})
 
         self.assert_partial_order(graph, sorted_nodes)
+
+    def test_long_chain(self):
+        # Longer than the recursion limit.
+        graph = {i: {i + 1} for i in range(5000)}
+
+        self.assertListEqual(topological(graph), list(range(5000)))